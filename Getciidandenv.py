@@ -19,34 +19,41 @@ import math
 import pandas as pd
 from typing import List, Dict
 
+import adoapi
+from instrument import timed, instrumented
+
 API_VERSION = "7.1-preview.1"  # works for repos & environments endpoints
+BASE_URL = os.environ.get("AZDO_URL", "https://dev.azure.com")
 
+@timed("azdo_get")
 def azdo_get(url: str, pat: str, params: dict = None):
-    """Simple GET with PAT (basic)."""
+    """GET with PAT (basic); returns every "value" item across continuation pages."""
     headers = {
         "Accept": "application/json"
     }
     # Basic auth: username can be empty, password is PAT
-    resp = requests.get(url, headers=headers, auth=("", pat), params=params, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    return adoapi.get_all(requests, url, params=params, headers=headers, auth=("", pat), timeout=30)
 
 def get_all_repos(org: str, project: str, pat: str) -> List[Dict]:
     """Return list of repo dicts for the project."""
-    url = f"https://dev.azure.com/{org}/{project}/_apis/git/repositories"
+    url = f"{BASE_URL}/{org}/{project}/_apis/git/repositories"
     params = {"api-version": API_VERSION}
-    data = azdo_get(url, pat, params=params)
-    return data.get("value", [])
+    return azdo_get(url, pat, params=params)
 
 def get_all_environments(org: str, project: str, pat: str) -> List[Dict]:
     """
     Return list of environment dicts for the project.
     Environments endpoint: distributedtask/environments
     """
-    url = f"https://dev.azure.com/{org}/{project}/_apis/distributedtask/environments"
-    params = {"api-version": API_VERSION, "$top": 1000}  # try to get many; will still return 'value'
-    data = azdo_get(url, pat, params=params)
-    return data.get("value", [])
+    url = f"{BASE_URL}/{org}/{project}/_apis/distributedtask/environments"
+    params = {"api-version": API_VERSION, "$top": 1000}  # larger sets continue on further pages
+    return azdo_get(url, pat, params=params)
+
+def get_all_pipelines(org: str, project: str, pat: str) -> List[Dict]:
+    """Return list of pipeline dicts for the project."""
+    url = f"{BASE_URL}/{org}/{project}/_apis/pipelines"
+    params = {"api-version": API_VERSION, "$top": 1000}
+    return azdo_get(url, pat, params=params)
 
 def extract_ciid(repo_name: str) -> str:
     """
@@ -62,6 +69,7 @@ def extract_ciid(repo_name: str) -> str:
     fallback = repo_name[:5]
     return fallback
 
+@instrumented
 def main(args):
     org = args.org
     project = args.project
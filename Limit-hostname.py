@@ -4,6 +4,7 @@ import json
 import traceback
 from glob import glob
 from prettytable import PrettyTable
+from membership import MembershipDelta
 
 class YamlLoader:
     @staticmethod
@@ -124,8 +125,7 @@ def generate_json(compute_data, state_data, target_hosts):
 
         print(f'Processing Host: {compute_name} | Hostnames: {hostnames}')
 
-        added_users = []
-        added_groups = {}
+        delta = MembershipDelta()
 
         user_args = []
         group_args = []
@@ -136,8 +136,7 @@ def generate_json(compute_data, state_data, target_hosts):
                 description = user['account-desc']
                 rdp = 'true' if user['logon-type'] == 'rdp' else 'false'
 
-                if username not in added_users:
-                    added_users.append(username)
+                delta.add_user(username)
 
                 user_args.append(f"create {username}|{description}")
 
@@ -148,12 +147,7 @@ def generate_json(compute_data, state_data, target_hosts):
                 user_list = group['user-list']
                 user_list_action = group['user-list-action']
 
-                for user in user_list:
-                    if user_list_action == 'add':
-                        if group_name not in added_groups.setdefault(user, []):
-                            added_groups[user].append(group_name)
-                    elif user_list_action == 'remove':
-                        added_groups.setdefault(user, []).remove(group_name)
+                delta.apply(group_name, user_list, user_list_action)
 
                 group_args.append(f"create {group_name}|{description}")
 
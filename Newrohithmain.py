@@ -1,14 +1,25 @@
 import os
 import yaml
 import json
-import subprocess
-from prettytable import PrettyTable
+import time
+import base64
+import signal
+import asyncio
+from reports import Section, open_report
+from membership import MembershipDelta
+from statestore import StateStore, config_hash
+from summary import ChangeSummary
+from instrument import timed, instrumented, file_size, text_size
+from pipelinelog import log
 import traceback
 from glob import glob
 import argparse
+from collections import deque
+from itertools import islice
 
 class YamlLoader:
     @staticmethod
+    @timed('yaml.load', size=file_size)
     def load(file_path):
         try:
             with open(file_path, 'r') as file:
@@ -18,6 +29,7 @@ class YamlLoader:
 
 class JsonLoader:
     @staticmethod
+    @timed('json.load', size=file_size)
     def load(file_path):
         try:
             with open(file_path, 'r') as file:
@@ -35,8 +47,9 @@ class Parser:
         else:
             return 'unknown'
 
+    @timed('parse_compute')
     def parse_compute(self, computeFilePath):
-        print(f'Parsing compute file: {computeFilePath}')
+        log.info(f'Parsing compute file: {computeFilePath}')
         data = {}
         try:
             compute_mf = YamlLoader.load(computeFilePath)
@@ -52,11 +65,12 @@ class Parser:
                     }
             return data
         except ValueError as e:
-            print(f"Error parsing compute file: {e}")
+            log.error(f"Error parsing compute file: {e}")
             return {}
 
+    @timed('parse_state')
     def parse_state(self, stateFilePath):
-        print(f'Parsing state file: {stateFilePath}')
+        log.info(f'Parsing state file: {stateFilePath}')
         data = {}
         try:
             state_file = JsonLoader.load(stateFilePath)
@@ -75,147 +89,707 @@ class Parser:
                     data[compute_name] = arr_ips
             return data
         except ValueError as e:
-            print(f"Error parsing state file: {e}")
+            log.error(f"Error parsing state file: {e}")
             return {}
 
 
+class CommandResult:
+    def __init__(self, command, buffer_lines):
+        self.command = command
+        self.returncode = None
+        self.status = 'pending'
+        self.stdout = deque(maxlen=buffer_lines)
+        self.stderr = deque(maxlen=buffer_lines)
+        self.duration = 0.0
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+    @property
+    def output(self):
+        return ''.join(self.stdout)
+
+    def classify(self):
+        if self.returncode == 0:
+            self.status = 'ok'
+        elif self.returncode in (127, 9009):
+            self.status = 'not-found'
+        elif self.returncode is not None and self.returncode < 0:
+            self.status = 'killed'
+        else:
+            self.status = 'failed'
+
+
 class Terminal:
-    errors = []
+    """Runs shell commands on the event loop.
+
+    stdout and stderr are read line by line into ring buffers of
+    buffer_lines lines, so long-running commands can be echoed live and
+    large outputs do not pile up in memory. A command is an error only
+    when it exits non-zero; stderr text on a successful command is kept
+    but not reported.
+    """
+
+    LINE_LIMIT = 16 * 1024 * 1024
+
+    def __init__(self, timeout=None, buffer_lines=1000, echo=False, prefix=''):
+        self.errors = []
+        self.results = []
+        self.timeout = timeout
+        self.buffer_lines = buffer_lines
+        self.echo = echo
+        self.prefix = prefix
 
     def get_errors(self):
         return self.errors
 
-    def run_command(self, command):
-        result = subprocess.run(command, capture_output=True, text=True, shell=True)
-        if result.stderr:
-            self.errors.append(result.stderr)
-        if result.stdout:
-            return result.stdout
-        return None
+    async def _pump(self, stream, buffer):
+        async for line in stream:
+            text = line.decode(errors='replace')
+            buffer.append(text)
+            if self.echo:
+                log.write(self.prefix + text.rstrip('\r\n'))
+
+    async def _communicate(self, process, result, input):
+        if input is not None:
+            process.stdin.write(input.encode())
+            await process.stdin.drain()
+            process.stdin.close()
+        await asyncio.gather(self._pump(process.stdout, result.stdout), self._pump(process.stderr, result.stderr))
+        return await process.wait()
+
+    async def _kill(self, process):
+        # Kill the whole process tree, not just the shell, so children that
+        # hold the output pipes open cannot outlive the timeout.
+        if os.name == 'nt':
+            killer = await asyncio.create_subprocess_shell(
+                f'taskkill /T /F /PID {process.pid}',
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            await killer.wait()
+        else:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        await process.wait()
+
+    async def execute(self, command, input=None):
+        result = CommandResult(command, self.buffer_lines)
+        self.results.append(result)
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=self.LINE_LIMIT,
+            start_new_session=os.name != 'nt'
+        )
+        try:
+            result.returncode = await asyncio.wait_for(self._communicate(process, result, input), self.timeout)
+            result.classify()
+        except asyncio.TimeoutError:
+            result.status = 'timeout'
+        finally:
+            # Also reached when the host deadline cancels this command.
+            if process.returncode is None:
+                await self._kill(process)
+            result.duration = time.monotonic() - start
+
+        if result.status == 'timeout':
+            raise TimeoutError(f"Command timed out after {self.timeout:.1f}s: {command}")
+        if not result.ok:
+            self.errors.append(f"{result.status} (exit {result.returncode}): {''.join(result.stderr) or command}")
+        return result
+
+    @timed('run_command', size=text_size)
+    async def run_command(self, command, input=None):
+        result = await self.execute(command, input)
+        return result.output or None
+
+
+class HostResult:
+    def __init__(self, host):
+        self.host = host
+        self.status = 'pending'
+        self.outputs = []
+        self.errors = []
+        self.duration = 0.0
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+
+class HostExecutor:
+    """Runs async per-host work on many hosts with a bounded fan-out.
+
+    run() applies one work function to a list of hosts; run_all() takes
+    (host, work) jobs from any number of computes. All jobs share one event
+    loop and one semaphore, so concurrency costs no thread per process and
+    max_workers bounds the whole estate. Each host gets its own Terminal and
+    HostResult, so errors never leak between hosts. host_timeout bounds the
+    total time spent on one host and command_timeout bounds each remote
+    command.
+    """
+
+    def __init__(self, max_workers=16, host_timeout=None, command_timeout=None, echo=False):
+        self.max_workers = max_workers
+        self.host_timeout = host_timeout
+        self.command_timeout = command_timeout
+        self.echo = echo
+
+    async def run_host(self, host, work, semaphore, host_lock):
+        # A host listed under several computes runs their work one after another
+        async with host_lock, semaphore:
+            result = HostResult(host)
+            start = time.monotonic()
+            terminal = Terminal(self.command_timeout, echo=self.echo, prefix=f'[{host}] ')
+            try:
+                result.outputs = await asyncio.wait_for(work(host, terminal), self.host_timeout) or []
+                result.status = 'ok'
+            except (TimeoutError, asyncio.TimeoutError) as e:
+                result.status = 'timeout'
+                terminal.errors.append(str(e) or f"Host timed out after {self.host_timeout:.1f}s")
+            except Exception as e:
+                result.status = 'failed'
+                terminal.errors.append(f"{type(e).__name__}: {e}")
+            result.errors = terminal.get_errors()
+            if result.status == 'ok' and result.errors:
+                result.status = 'error'
+            result.duration = time.monotonic() - start
+            return result
+
+    async def run_async(self, jobs):
+        """Run every (host, work) job under one semaphore; results come back in job order."""
+        semaphore = asyncio.Semaphore(self.max_workers)
+        host_locks = {host: asyncio.Lock() for host, _ in jobs}
+        tasks = [asyncio.ensure_future(self.run_host(host, work, semaphore, host_locks[host])) for host, work in jobs]
+        for done, future in enumerate(asyncio.as_completed(tasks), 1):
+            result = await future
+            log.info(f"[{done}/{len(jobs)}] {result.host}: {result.status} ({result.duration:.1f}s)",
+                     host=result.host, status=result.status, duration=result.duration, errors=result.errors)
+        return [task.result() for task in tasks]
+
+    def run(self, hosts, work):
+        return self.run_all([(host, work) for host in hosts])
+
+    def run_all(self, jobs):
+        """Run (host, work) jobs of any number of computes in one event loop, so max_workers spans all of them."""
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        return asyncio.run(self.run_async(jobs))
+
+
+def powershell_command(script):
+    encoded = base64.b64encode(script.encode('utf-16-le')).decode()
+    return f"powershell.exe -NoProfile -NonInteractive -EncodedCommand {encoded}"
+
+def ps_quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def remote_command(remote_ip, script):
+    return powershell_command(f"Invoke-Command -ComputerName {ps_quote(remote_ip)} -ErrorAction Stop -ScriptBlock {{ {script} }}")
+
+def user_action_script(user):
+    script = (
+        f"if (-not (Get-LocalUser -Name {ps_quote(user['username'])} -ErrorAction SilentlyContinue)) {{ "
+        f"New-LocalUser -Name {ps_quote(user['username'])} -Description {ps_quote(user['description'])} "
+        f"-Password (ConvertTo-SecureString {ps_quote(user['password'])} -AsPlainText -Force) | Out-Null }}"
+    )
+    if user['rdp'] == 'true':
+        script += f"; Add-LocalGroupMember -Group 'Remote Desktop Users' -Member {ps_quote(user['username'])} -ErrorAction SilentlyContinue"
+    return script
+
+def group_action_script(group):
+    script = (
+        f"if (-not (Get-LocalGroup -Name {ps_quote(group['groupName'])} -ErrorAction SilentlyContinue)) {{ "
+        f"New-LocalGroup -Name {ps_quote(group['groupName'])} -Description {ps_quote(group['description'])} | Out-Null }}"
+    )
+    return script
+
+def member_action_script(group_name, user, action):
+    # Same checks as the add-member/remove-member ops of win-batch-action.ps1; a failed change stops the command
+    member = f"Get-LocalGroupMember -Group {ps_quote(group_name)} -Member {ps_quote(user)} -ErrorAction SilentlyContinue"
+    if action == 'add':
+        return f"if (-not ({member})) {{ Add-LocalGroupMember -Group {ps_quote(group_name)} -Member {ps_quote(user)} -ErrorAction Stop }}"
+    return f"if ({member}) {{ Remove-LocalGroupMember -Group {ps_quote(group_name)} -Member {ps_quote(user)} -ErrorAction Stop }}"
+
+IP_ADDRESSES = Section('ip', 'IP Addresses', [('ip', 'IP Address')], empty="No IP addresses found for this compute.")
+USERS_ADDED = Section('user-added', 'Users Added', [('user', 'User'), ('groups', 'Groups Added')], empty="No users added.")
+USERS_REMOVED = Section('user-removed', 'Users Removed', [('user', 'User'), ('groups', 'Groups Removed')], empty="No users removed.")
+USERS_CREATED = Section('user-created', 'Users Created', [('user', 'User'), ('description', 'Description'), ('rdp', 'RDP')],
+                        empty="No users created.")
+GROUPS_CREATED = Section('group-created', 'Groups Created', [('group', 'Group'), ('description', 'Description')],
+                         empty="No groups created.")
+WARNINGS = Section('warning', 'WARNINGS', [('message', 'Message')], level='warning')
+REPORT_SECTIONS = [IP_ADDRESSES, USERS_ADDED, USERS_REMOVED, USERS_CREATED, GROUPS_CREATED, WARNINGS]
 
 class Report:
-    def __init__(self):
+    def __init__(self, backend=None):
         self.data = {}
+        self.backend = backend
+        self.written = 0
 
     def set_data(self, data):
         self.data = data
 
-    def print_data(self):
-        if not self.data:
-            print("No data to report.")
-            return
+    def open(self):
+        if self.backend is None:
+            self.backend = open_report('windows_users_groups', REPORT_SECTIONS, stream=log.console, warn=log.warning)
+        return self.backend
+
+    def add(self, compute_name, report_data):
+        # Rendered straight away so a large estate is never held in memory twice.
+        backend = self.open()
+        backend.begin(compute_name)
+        for ip in report_data.get('ip_addresses', []):
+            backend.record(IP_ADDRESSES, (ip,))
+        for user, groups in report_data.get('added_users', {}).items():
+            backend.record(USERS_ADDED, (user, groups or []))
+        for user, groups in report_data.get('removed_users', {}).items():
+            backend.record(USERS_REMOVED, (user, groups or []))
+        for user in report_data.get('created_users', []):
+            backend.record(USERS_CREATED, (user['username'], user['description'], user['rdp']))
+        for group in report_data.get('created_groups', []):
+            backend.record(GROUPS_CREATED, (group['groupName'], group['description']))
+        for err in report_data.get('errors', []):
+            backend.record(WARNINGS, (err,))
+        backend.end()
+        self.written += 1
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
 
+    @timed('report')
+    def print_data(self):
         for compute_name, report_data in self.data.items():
-            print(f"===========================SUMMARY for {compute_name}=====================")
+            self.add(compute_name, report_data)
+        if not self.written:
+            log.write("No data to report.")
+        self.close()
+
+
+BATCH_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'win-batch-action.ps1')
+
+def build_host_batch(add_users_data, add_groups_data, delta):
+    # Groups and users are created before any membership change refers to them.
+    operations = []
+    for group in add_groups_data:
+        operations.append({'op': 'create-group', 'group': group['groupName'], 'description': group['description']})
+    for user in add_users_data:
+        operations.append({
+            'op': 'create-user',
+            'user': user['username'],
+            'description': user['description'],
+            'password': user['password'],
+            'rdp': user['rdp'] == 'true'
+        })
+    added, removed = delta.diff()
+    for user, group_name in added:
+        operations.append({'op': 'add-member', 'group': group_name, 'user': user})
+    for user, group_name in removed:
+        operations.append({'op': 'remove-member', 'group': group_name, 'user': user})
+    for op_id, operation in enumerate(operations):
+        operation['id'] = op_id
+    return {'operations': operations}
+
+def parse_batch_results(stdout):
+    for line in reversed((stdout or '').splitlines()):
+        line = line.strip()
+        if line.startswith('['):
+            return json.loads(line)
+    raise ValueError('No batch result returned by win-batch-action.ps1')
+
+async def run_host_batch(remote_ip, terminal, batch):
+    # The payload goes over stdin, so its size is not limited by the command line.
+    script = (
+        f"$payload = [Console]::In.ReadToEnd(); "
+        f"Invoke-Command -ComputerName {ps_quote(remote_ip)} -FilePath {ps_quote(BATCH_SCRIPT)} "
+        f"-ArgumentList $payload -ErrorAction Stop"
+    )
+    stdout = await terminal.run_command(powershell_command(script), input=json.dumps(batch))
+    operations = {operation['id']: operation for operation in batch['operations']}
+    results = []
+    for item in parse_batch_results(stdout):
+        operation = operations.get(item.get('id'), {})
+        result = {
+            'id': item.get('id'),
+            'op': operation.get('op'),
+            'user': operation.get('user', ''),
+            'group': operation.get('group', ''),
+            'status': item.get('status'),
+            'message': item.get('message', '')
+        }
+        if result['status'] == 'failed':
+            terminal.errors.append(f"{result['op']} user={result['user']} group={result['group']}: {result['message']}")
+        results.append(result)
+    return results
+
+INVENTORY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'win-inventory.ps1')
+RDP_GROUP = 'Remote Desktop Users'
+INVENTORY_FORMAT = 2  # members keep their domain prefix; older snapshots stripped it
+INVENTORY_MAX_AGE = 900  # long enough to cover a rerun of a failed stage, short enough to catch drift on the next run
+
+def member_name(name):
+    """Comparable form of a group member: lower-cased, with only the local ".\\" prefix dropped."""
+    name = name.lower()
+    return name[2:] if name.startswith('.\\') else name
+
+class HostInventory:
+    """Snapshot of a host's local users, groups and memberships.
 
-            if not report_data.get('ip_addresses'):
-                print("No IP addresses found for this compute.")
+    Windows account names are case-insensitive, so every name is kept
+    lower-cased for comparison. Group members keep their domain prefix
+    (corp\\alice), so a domain account never stands in for the local
+    account of the same name.
+    """
+
+    def __init__(self, users=(), groups=None, fetched_at=None):
+        self.users = {user.lower() for user in users}
+        self.groups = {name.lower(): {member_name(member) for member in members or []}
+                       for name, members in (groups or {}).items()}
+        self.fetched_at = fetched_at or time.time()
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get('users', []), data.get('groups', {}), data.get('fetched_at'))
+
+    def to_json(self):
+        return {
+            'format': INVENTORY_FORMAT,
+            'users': sorted(self.users),
+            'groups': {name: sorted(members) for name, members in self.groups.items()},
+            'fetched_at': self.fetched_at
+        }
+
+    def is_member(self, group_name, user):
+        return member_name(user) in self.groups.get(group_name.lower(), ())
+
+    def pending_operations(self, operations):
+        """Return only the operations that would change this host."""
+        pending = []
+        for operation in operations:
+            op = operation['op']
+            if op == 'create-group':
+                if operation['group'].lower() not in self.groups:
+                    pending.append(operation)
+            elif op == 'create-user':
+                if operation['user'].lower() not in self.users:
+                    pending.append(operation)
+                elif operation['rdp'] and not self.is_member(RDP_GROUP, operation['user']):
+                    pending.append({'op': 'add-member', 'group': RDP_GROUP, 'user': operation['user'], 'id': operation['id']})
+            elif op == 'add-member':
+                if not self.is_member(operation['group'], operation['user']):
+                    pending.append(operation)
+            elif op == 'remove-member':
+                if self.is_member(operation['group'], operation['user']):
+                    pending.append(operation)
+            else:
+                pending.append(operation)
+        return pending
+
+    def apply(self, operations, results):
+        # Keep the cached snapshot in step with what the host reported.
+        done = {result['id'] for result in results if result.get('status') in ('ok', 'skipped')}
+        for operation in operations:
+            if operation['id'] not in done:
                 continue
+            op = operation['op']
+            if op == 'create-group':
+                self.groups.setdefault(operation['group'].lower(), set())
+            elif op == 'create-user':
+                self.users.add(operation['user'].lower())
+                if operation['rdp']:
+                    self.groups.setdefault(RDP_GROUP.lower(), set()).add(member_name(operation['user']))
+            elif op == 'add-member':
+                self.groups.setdefault(operation['group'].lower(), set()).add(member_name(operation['user']))
+            elif op == 'remove-member':
+                self.groups.get(operation['group'].lower(), set()).discard(member_name(operation['user']))
 
-            t1 = PrettyTable(['IP Address'])
-            for ip in report_data['ip_addresses']:
-                t1.add_row([ip])
-            print("IP Addresses:")
-            print(t1)
-
-            t2 = PrettyTable(['User', 'Groups Added'])
-            added_users = report_data.get('added_users', {})
-            for user, groups in added_users.items():
-                t2.add_row([user, ', '.join(groups) if groups else ""])
-            print("Users Added:")
-            if added_users: print(t2)
-            else: print("No users added.")
-
-            t3 = PrettyTable(['User', 'Groups Removed'])
-            removed_users = report_data.get('removed_users', {})
-            for user, groups in removed_users.items():
-                t3.add_row([user, ', '.join(groups) if groups else ""])
-            print("Users Removed:")
-            if removed_users: print(t3)
-            else: print("No users removed.")
-
-            created_users = report_data.get('created_users', [])
-            if created_users:
-                t4 = PrettyTable(['User', 'Description', 'RDP'])
-                for user in created_users:
-                    t4.add_row([user['username'], user['description'], user['rdp']])
-                print("Users Created:")
-                print(t4)
-            else: print("No users created.")
-
-            created_groups = report_data.get('created_groups', [])
-            if created_groups:
-                t5 = PrettyTable(['Group', 'Description'])
-                for group in created_groups:
-                    t5.add_row([group['groupName'], group['description']])
-                print("Groups Created:")
-                print(t5)
-            else: print("No groups created.")
-
-            errors = report_data.get('errors', [])
-            if errors:
-                print('##vso[task.logissue type=warning]=========WARNINGS=======')
-                for err in errors:
-                    print(err)
-            print('')
-
-
-def create_windows_users_groups(compute_name, compute_data, state_data, new_user_password, terminal):
-    added_users = {}
-    added_groups = {}
-    removed_users = {}
+
+class InventoryCache:
+    """Keeps host inventories for the run, optionally on disk between runs.
+
+    Snapshots on disk older than max_age seconds, or written in an older
+    INVENTORY_FORMAT, are fetched again, so a later run still sees drift on
+    the host; max_age=0 never reuses them.
+    """
+
+    def __init__(self, cache_dir=None, max_age=INVENTORY_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.snapshots = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, host):
+        return os.path.join(self.cache_dir, f"{host.replace(':', '_')}.json")
+
+    def load(self, host):
+        if host in self.snapshots:
+            return self.snapshots[host]
+        if not self.cache_dir or not os.path.exists(self.path(host)):
+            return None
+        try:
+            data = JsonLoader.load(self.path(host))
+        except ValueError:
+            return None
+        if data.get('format') != INVENTORY_FORMAT:
+            return None
+        inventory = HostInventory.from_json(data)
+        if time.time() - inventory.fetched_at > self.max_age:
+            return None
+        self.snapshots[host] = inventory
+        return inventory
+
+    def save(self, host, inventory):
+        self.snapshots[host] = inventory
+        if self.cache_dir:
+            with open(self.path(host), 'w') as file:
+                json.dump(inventory.to_json(), file)
+
+async def fetch_inventory(remote_ip, terminal):
+    script = f"Invoke-Command -ComputerName {ps_quote(remote_ip)} -FilePath {ps_quote(INVENTORY_SCRIPT)} -ErrorAction Stop"
+    stdout = await terminal.run_command(powershell_command(script))
+    for line in reversed((stdout or '').splitlines()):
+        line = line.strip()
+        if line.startswith('{'):
+            return HostInventory.from_json(json.loads(line))
+    raise ValueError('No inventory returned by win-inventory.ps1')
+
+async def reconcile_host(remote_ip, terminal, batch, cache):
+    inventory = cache.load(remote_ip)
+    if inventory is None:
+        inventory = await fetch_inventory(remote_ip, terminal)
+        cache.save(remote_ip, inventory)
+
+    operations = inventory.pending_operations(batch['operations'])
+    if not operations:
+        return []
+
+    results = await run_host_batch(remote_ip, terminal, {'operations': operations})
+    inventory.apply(operations, results)
+    cache.save(remote_ip, inventory)
+    return results
+
+class ComputePlan:
+    """The per-host work of one Windows compute, and what is recorded once it has run."""
+
+    def __init__(self, compute_name, hosts, apply_to_host, delta, desired_hash, created_users, created_groups):
+        self.compute_name = compute_name
+        self.hosts = hosts
+        self.apply_to_host = apply_to_host
+        self.delta = delta
+        self.desired_hash = desired_hash
+        self.created_users = created_users
+        self.created_groups = created_groups
+
+def plan_windows_users_groups(compute_name, compute_data, state_data, new_user_password, batch=True,
+                              inventory_cache=None, state_store=None):
+    """Return the ComputePlan of compute_name, or None when it is not a Windows compute of both files."""
+    delta = MembershipDelta()
     created_users = []
     created_groups = []
 
     if compute_name not in compute_data or compute_name not in state_data:
-        print(f"Warning: Compute '{compute_name}' not found in configuration or state data.")
-        return added_users, added_groups, removed_users, created_users, created_groups
+        log.warning(f"Compute '{compute_name}' not found in configuration or state data.", compute=compute_name)
+        return None
 
     if compute_data[compute_name]['os'] != 'windows':
-        print(f"Warning: Compute '{compute_name}' is not a Windows machine. Skipping...")
-        return added_users, added_groups, removed_users, created_users, created_groups
-
-    for remote_ip in state_data.get(compute_name, []):
-        add_users_data = []
-        add_groups_data = []
-        modified_groups = []
-
-        if compute_data[compute_name]['os_users']:
-            for user in compute_data[compute_name]['os_users']:
-                username = user['account-name']
-                description = user['account-desc']
-                rdp = 'true' if user['logon-type'] == 'rdp' else 'false'
-                password = user.get('password', new_user_password)
-
-                if username not in added_users:
-                    added_users[username] = []
-                    created_users.append({'username': username, 'description': description, 'rdp': rdp})
-                    add_users_data.append({
-                        'username': username,
-                        'description': description,
-                        'rdp': rdp,
-                        'password': password
-                    })
-
-        if compute_data[compute_name]['os_groups']:
-            for group in compute_data[compute_name]['os_groups']:
-                group_name = group['group-name']
-                description = group['group-desc']
-                user_list = group['user-list']
-                user_list_action = group['user-list-action']
-
-                for user in user_list:
-                    if user_list_action == 'add':
-                        if group_name not in added_groups.setdefault(user, []):
-                            added_groups[user].append(group_name)
-                    elif user_list_action == 'remove':
-                        if group_name not in removed_users.setdefault(user, []):
-                            removed_users[user].append(group_name)
-                created_groups.append({'groupName': group_name, 'description': description})
-                add_groups_data.append({
-                    'groupName': group_name,
+        log.warning(f"Compute '{compute_name}' is not a Windows machine. Skipping...", compute=compute_name)
+        return None
+
+    add_users_data = []
+    add_groups_data = []
+
+    if compute_data[compute_name]['os_users']:
+        for user in compute_data[compute_name]['os_users']:
+            username = user['account-name']
+            description = user['account-desc']
+            rdp = 'true' if user['logon-type'] == 'rdp' else 'false'
+            password = user.get('password', new_user_password)
+
+            if delta.add_user(username):
+                created_users.append({'username': username, 'description': description, 'rdp': rdp})
+                add_users_data.append({
+                    'username': username,
                     'description': description,
-                    'userList': user_list,
-                    'userListAction': user_list_action
+                    'rdp': rdp,
+                    'password': password
                 })
-                modified_
+
+    if compute_data[compute_name]['os_groups']:
+        for group in compute_data[compute_name]['os_groups']:
+            group_name = group['group-name']
+            description = group['group-desc']
+            user_list = group['user-list']
+            user_list_action = group['user-list-action']
+
+            delta.apply(group_name, user_list, user_list_action)
+            created_groups.append({'groupName': group_name, 'description': description})
+            add_groups_data.append({
+                'groupName': group_name,
+                'description': description,
+                'userList': user_list,
+                'userListAction': user_list_action
+            })
+
+    if inventory_cache is not None:
+        host_batch = build_host_batch(add_users_data, add_groups_data, delta)
+
+        async def apply_to_host(remote_ip, terminal):
+            return await reconcile_host(remote_ip, terminal, host_batch, inventory_cache)
+    elif batch:
+        host_batch = build_host_batch(add_users_data, add_groups_data, delta)
+
+        async def apply_to_host(remote_ip, terminal):
+            return await run_host_batch(remote_ip, terminal, host_batch)
+    else:
+        # Same order as build_host_batch: groups, then users, then the membership changes that refer to both.
+        added, removed = delta.diff()
+        scripts = [group_action_script(group) for group in add_groups_data]
+        scripts += [user_action_script(user) for user in add_users_data]
+        scripts += [member_action_script(group_name, user, 'add') for user, group_name in added]
+        scripts += [member_action_script(group_name, user, 'remove') for user, group_name in removed]
+
+        async def apply_to_host(remote_ip, terminal):
+            return [await terminal.run_command(remote_command(remote_ip, script)) for script in scripts]
+
+    hosts = state_data.get(compute_name, [])
+    # Passwords stay out of the hash, which is stored in the state database
+    hashed_users = [{key: value for key, value in user.items() if key != 'password'} for user in add_users_data]
+    desired_hash = config_hash({'users': hashed_users, 'groups': add_groups_data})
+    if state_store is not None:
+        changed_hosts = state_store.changed_hosts(compute_name, hosts, desired_hash)
+        if len(changed_hosts) < len(hosts):
+            log.info(f"Skipping {len(hosts) - len(changed_hosts)} host(s) of {compute_name} with unchanged desired state",
+                     compute=compute_name)
+        hosts = changed_hosts
+
+    return ComputePlan(compute_name, hosts, apply_to_host, delta, desired_hash, created_users, created_groups)
+
+def finish_windows_users_groups(plan, host_results, state_store=None):
+    """Record the hosts of plan that applied cleanly and return what create_windows_users_groups reports."""
+    delta = plan.delta
+    if state_store is not None:
+        added, _ = delta.diff()
+        state_store.record(plan.compute_name, [result.host for result in host_results if result.ok],
+                           plan.desired_hash, delta.users, added, 'create_windows_users_groups')
+
+    added_users = {username: [] for username in delta.users}
+    return added_users, delta.added_groups(), delta.removed_groups(), plan.created_users, plan.created_groups, host_results
+
+def create_windows_users_groups(compute_name, compute_data, state_data, new_user_password, executor=None, batch=True,
+                                inventory_cache=None, state_store=None):
+    plan = plan_windows_users_groups(compute_name, compute_data, state_data, new_user_password, batch,
+                                     inventory_cache, state_store)
+    if plan is None:
+        return {}, {}, {}, [], [], []
+    executor = executor or HostExecutor()
+    return finish_windows_users_groups(plan, executor.run(plan.hosts, plan.apply_to_host), state_store)
+
+
+@instrumented
+def main():
+    parser = argparse.ArgumentParser(description="Create Windows local users and groups on every host of each compute")
+    parser.add_argument("--computeFilePath", default=os.getenv("computeFilePath"), help="Path to compute_mf.yml")
+    parser.add_argument("--stateFilePath", default=os.getenv("stateFilePath"), help="Path (or glob) to the state JSON file")
+    parser.add_argument("--password", default=os.getenv("newUserPassword"), help="Password for users without one in the manifest")
+    parser.add_argument("--fanOut", type=int, default=int(os.getenv("fanOut", "16")), help="Hosts processed concurrently")
+    parser.add_argument("--hostTimeout", type=float, default=float(os.getenv("hostTimeout", "0")) or None, help="Seconds allowed per host")
+    parser.add_argument("--perAction", action="store_true", default=os.getenv("perAction", "false").lower() == "true",
+                        help="Run one remote command per action instead of one batch per host")
+    parser.add_argument("--reconcile", action="store_true", default=os.getenv("reconcile", "false").lower() == "true",
+                        help="Diff against each host's current users and groups and send only the changes")
+    parser.add_argument("--inventoryCacheDir", default=os.getenv("inventoryCacheDir"), help="Directory for cached host inventories")
+    parser.add_argument("--inventoryMaxAge", type=float, default=float(os.getenv("inventoryMaxAge", INVENTORY_MAX_AGE)),
+                        help=f"Seconds a cached inventory stays valid (default: {INVENTORY_MAX_AGE}; 0 always re-queries)")
+    parser.add_argument("--stateDb", default=os.getenv("stateDb"), help="SQLite file recording what was applied to each host")
+    parser.add_argument("--echo", action="store_true", default=os.getenv("echoOutput", "false").lower() == "true",
+                        help="Stream remote command output to the log as it arrives")
+    parser.add_argument("--commandTimeout", type=float, default=float(os.getenv("commandTimeout", "0")) or None, help="Seconds allowed per remote command")
+    parser.add_argument("--reportFormat", default=os.getenv("reportFormat", "text"),
+                        help="Comma separated report formats: text, table, jsonl, csv, html")
+    parser.add_argument("--reportDir", default=os.getenv("reportDir", "."), help="Directory for jsonl/csv/html report files")
+    parser.add_argument("--summaryPath", default=os.getenv("summaryPath", "change_summary.json"),
+                        help="Where to write the estate-wide change summary")
+    parser.add_argument("--publishSummary", action="store_true", default=os.getenv("publishSummary", "false").lower() == "true",
+                        help="Publish summary totals as pipeline variables")
+    args = parser.parse_args()
+
+    try:
+        config_parser = Parser()
+        compute_data = config_parser.parse_compute(args.computeFilePath)
+        state_data = config_parser.parse_state(glob(args.stateFilePath)[0])
+        executor = HostExecutor(args.fanOut, args.hostTimeout, args.commandTimeout, args.echo)
+        inventory_cache = InventoryCache(args.inventoryCacheDir, args.inventoryMaxAge) if args.reconcile else None
+        state_store = StateStore(args.stateDb) if args.stateDb else None
+
+        summary = ChangeSummary()
+        report = Report(open_report('windows_users_groups', REPORT_SECTIONS, args.reportFormat, args.reportDir,
+                                    log.console, log.warning))
+        plans = {compute_name: plan_windows_users_groups(compute_name, compute_data, state_data, args.password,
+                                                         not args.perAction, inventory_cache, state_store)
+                 for compute_name in state_data}
+        # Hosts of every compute share one event loop, so --fanOut bounds concurrency across the estate
+        all_results = iter(executor.run_all((host, plan.apply_to_host) for plan in plans.values() if plan
+                                            for host in plan.hosts))
+        for compute_name, plan in plans.items():
+            if plan is None:
+                added_users, added_groups, removed_users, created_users, created_groups, host_results = {}, {}, {}, [], [], []
+            else:
+                host_results = list(islice(all_results, len(plan.hosts)))
+                added_users, added_groups, removed_users, created_users, created_groups, host_results = \
+                    finish_windows_users_groups(plan, host_results, state_store)
+            os_type = compute_data.get(compute_name, {}).get('os', 'unknown')
+            summary.compute(compute_name, os_type, state_data[compute_name])
+            if os_type != 'windows':
+                summary.skipped(compute_name, "not a Windows machine")
+            for user in created_users:
+                summary.user_created(compute_name, user['username'])
+            for group in created_groups:
+                summary.group_created(compute_name, group['groupName'])
+            for user, groups in added_groups.items():
+                for group_name in groups:
+                    summary.membership(compute_name, group_name, user, 'add')
+            for user, groups in removed_users.items():
+                for group_name in groups:
+                    summary.membership(compute_name, group_name, user, 'remove')
+            for result in host_results:
+                for error in result.errors:
+                    summary.error(compute_name, error, host=result.host)
+
+            for user, groups in added_groups.items():
+                added_users.setdefault(user, []).extend(groups)
+            report.add(compute_name, {
+                'ip_addresses': state_data[compute_name],
+                'added_users': added_users,
+                'removed_users': removed_users,
+                'created_users': created_users,
+                'created_groups': created_groups,
+                'errors': [f"{result.host}: {error}" for result in host_results for error in result.errors]
+            })
+
+        if state_store is not None:
+            state_store.close()
+
+        report.print_data()
+        summary.write(args.summaryPath)
+        if args.publishSummary:
+            log.flush()
+            summary.publish(path=args.summaryPath)
+
+    except Exception as e:
+        log.error(f' {traceback.format_exc()}')
+        log.write(f'##vso[task.complete result=SucceededWithIssues;] Task completed with warnings')
+    finally:
+        log.close()
+
+if __name__ == "__main__":
+    main()
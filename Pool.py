@@ -1,67 +1,87 @@
-import requests
 import csv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import base64
 import os
 
+from instrument import instrumented
+
 # CONFIG
 ORG = "your-org"
 PROJECT = "your-project"
 POOL_ID = 123   # your agent pool ID
 API_VERSION = "7.1-preview.1"
+BASE_URL = os.environ.get("AZDO_URL", "https://dev.azure.com")
+
+CSV_HEADER = [
+    "Job ID", "Queue Time", "Assign Time", "Finish Time",
+    "Result", "Agent Name", "Pipeline Triggered By", "Pipeline Name"
+]
+
+
+def job_requests_url(org, project, pool_id, api_version=API_VERSION):
+    # Without a project the organisation-level pool endpoint is used
+    scope = f"{org}/{project}" if project else org
+    return f"{BASE_URL}/{scope}/_apis/distributedtask/pools/{pool_id}/jobrequests?api-version={api_version}"
+
+
+def fetch_job_requests(url, pat):
+    import requests
+    import adoapi
+
+    # Create auth header
+    auth_header = base64.b64encode(f":{pat}".encode()).decode()
+    headers = {
+        "Authorization": f"Basic {auth_header}"
+    }
+
+    return adoapi.get_all(requests, url, headers=headers)
+
+
+def job_rows(jobs, start_time):
+    for job in jobs:
+        assign_time = job.get("assignTime")
+
+        # Filter on assign time
+        if assign_time:
+            assign_dt = datetime.fromisoformat(assign_time.replace("Z", "+00:00"))
+            if assign_dt < start_time:
+                continue
+
+        yield [
+            job.get("requestId"),
+            job.get("queueTime"),
+            job.get("assignTime"),
+            job.get("finishTime"),
+            job.get("result"),
+            (job.get("agent") or {}).get("name"),
+            (job.get("owner") or {}).get("name"),
+            (job.get("definition") or {}).get("name"),
+        ]
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+
+
+def export_pool_jobs(pat, org=ORG, project=PROJECT, pool_id=POOL_ID, hours=24, out="agent_pool_jobs.csv"):
+    start_time = datetime.now(timezone.utc) - timedelta(hours=hours)
+    jobs = fetch_job_requests(job_requests_url(org, project, pool_id), pat)
+    write_csv(job_rows(jobs, start_time), out)
+    print(f"Saved: {out}")
+
+
+@instrumented
+def main():
+    # PAT can be taken from environment variable
+    pat = os.getenv("ADO_PAT")
+    if not pat:
+        raise Exception("Please set ADO_PAT as environment variable")
+
+    export_pool_jobs(pat)
+
 
-# PAT can be taken from environment variable
-PAT = os.getenv("ADO_PAT")  
-if not PAT:
-    raise Exception("Please set ADO_PAT as environment variable")
-
-# Create auth header
-auth_header = base64.b64encode(f":{PAT}".encode()).decode()
-
-# Time filter: last 24 hours
-end_time = datetime.utcnow()
-start_time = end_time - timedelta(hours=24)
-
-# API URL
-url = f"https://dev.azure.com/{ORG}/{PROJECT}/_apis/distributedtask/pools/{POOL_ID}/jobrequests?api-version={API_VERSION}"
-
-headers = {
-    "Authorization": f"Basic {auth_header}"
-}
-
-response = requests.get(url, headers=headers)
-data = response.json()
-
-rows = []
-
-for job in data.get("value", []):
-    assign_time = job.get("assignTime")
-    finish_time = job.get("finishTime")
-
-    # Filter last 24 hours
-    if assign_time:
-        assign_dt = datetime.fromisoformat(assign_time.replace("Z", "+00:00"))
-        if assign_dt < start_time:
-            continue
-
-    rows.append([
-        job.get("requestId"),
-        job.get("queueTime"),
-        job.get("assignTime"),
-        job.get("finishTime"),
-        job.get("result"),
-        job.get("agent", {}).get("name"),
-        job.get("owner", {}).get("name"),
-        job.get("definition", {}).get("name"),
-    ])
-
-# Write CSV
-with open("agent_pool_jobs.csv", "w", newline="", encoding="utf-8") as file:
-    writer = csv.writer(file)
-    writer.writerow([
-        "Job ID", "Queue Time", "Assign Time", "Finish Time",
-        "Result", "Agent Name", "Pipeline Triggered By", "Pipeline Name"
-    ])
-    writer.writerows(rows)
-
-print("Saved: agent_pool_jobs.csv")
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
-import requests
 import base64
 import json
 import os
-import urllib3
 
-urllib3.disable_warnings()
+import adoapi
+from instrument import instrumented
 
 # ---------------- CONFIG ----------------
 
@@ -14,124 +13,130 @@ pat = "YOUR_PAT_TOKEN"
 
 file_path = r"C:\Users\Rohith\Desktop\11111-test-NON_PROD-08.txt"
 
-# ----------------------------------------
-
-secure_file_name = os.path.splitext(os.path.basename(file_path))[0]
-
-print("Secure file name:", secure_file_name)
-
-# Extract CIID
-ciid = secure_file_name.split("-")[0]
-
-# Detect environment
-if "NON_PROD" in secure_file_name:
-    environment = "NON_PROD"
-else:
-    environment = "PROD"
-
-print("CIID:", ciid)
-print("Environment:", environment)
-
-# ---------------- AUTH ----------------
-
-auth = base64.b64encode(f":{pat}".encode()).decode()
-
-headers = {
-    "Authorization": f"Basic {auth}",
-    "Content-Type": "application/octet-stream"
-}
-
-# ---------------- STEP 1 : Upload Secure File ----------------
-
-upload_url = f"https://ado.global.standardchartered.com/{organization}/{project}/_apis/distributedtask/securefiles?name={secure_file_name}&api-version=7.1-preview.1"
-
-with open(file_path, "rb") as f:
-    response = requests.post(upload_url, headers=headers, data=f, verify=False)
-
-if response.status_code not in [200, 201]:
-    print("Upload failed")
-    print(response.text)
-    exit()
+ADO_URL = "https://ado.global.standardchartered.com"
+VSSPS_URL = "https://vssps.ado.global.standardchartered.com"
+API_VERSION = "7.1-preview.1"
+SECURE_FILE_NAMESPACE = "52d39943-cb85-4d7f-8fa8-c6baac873819"
 
-secure_file_id = response.json()["id"]
-
-print("Secure file uploaded successfully")
-
-# ---------------- STEP 2 : Get All Groups ----------------
-
-graph_url = f"https://vssps.ado.global.standardchartered.com/{organization}/_apis/graph/groups?subjectTypes=vssgp&api-version=7.1-preview.1"
+# ----------------------------------------
 
-group_response = requests.get(graph_url, headers={"Authorization": f"Basic {auth}"}, verify=False)
 
-groups = group_response.json()["value"]
+def parse_secure_file_name(path):
+    """Return (secure_file_name, ciid, environment) for a file named <ciid>-...[-NON_PROD]-..."""
+    secure_file_name = os.path.splitext(os.path.basename(path))[0]
 
-# ---------------- STEP 3 : Filter Correct Groups ----------------
+    # Extract CIID
+    ciid = secure_file_name.split("-")[0]
 
-target_groups = []
+    # Detect environment
+    if "NON_PROD" in secure_file_name:
+        environment = "NON_PROD"
+    else:
+        environment = "PROD"
 
-for g in groups:
+    return secure_file_name, ciid, environment
 
-    name = g["displayName"]
 
+def target_group_names(ciid, environment):
     if environment == "NON_PROD":
+        return [f"ADO-{ciid}-Engineer-review", f"ADO-{ciid}-Engineer-write"]
+    return [f"ADO-{ciid}-PSS-review", f"ADO-{ciid}-PSS-write"]
 
-        if name in [
-            f"ADO-{ciid}-Engineer-review",
-            f"ADO-{ciid}-Engineer-write"
-        ]:
-            target_groups.append(g)
 
-    else:
+def auth_header(token):
+    return "Basic " + base64.b64encode(f":{token}".encode()).decode()
 
-        if name in [
-            f"ADO-{ciid}-PSS-review",
-            f"ADO-{ciid}-PSS-write"
-        ]:
-            target_groups.append(g)
 
-print("Groups that will be assigned:")
-
-for g in target_groups:
-    print(g["displayName"])
+# ---------------- STEP 1 : Upload Secure File ----------------
 
-# ---------------- STEP 4 : Assign Permissions ----------------
+def upload_secure_file(session, organization, project, secure_file_name, path):
+    upload_url = f"{ADO_URL}/{organization}/{project}/_apis/distributedtask/securefiles?name={secure_file_name}&api-version={API_VERSION}"
 
-security_namespace = "52d39943-cb85-4d7f-8fa8-c6baac873819"
+    # Read up front so a throttled upload can be sent again
+    with open(path, "rb") as f:
+        content = f.read()
+    response = adoapi.request(session, "POST", upload_url, headers={"Content-Type": "application/octet-stream"}, data=content, verify=False)
 
-security_url = f"https://ado.global.standardchartered.com/{organization}/_apis/accesscontrolentries/{security_namespace}?api-version=7.1-preview.1"
+    if response.status_code not in [200, 201]:
+        print("Upload failed")
+        print(response.text)
+        return None
 
-headers_json = {
-    "Authorization": f"Basic {auth}",
-    "Content-Type": "application/json"
-}
+    print("Secure file uploaded successfully")
+    return response.json()["id"]
 
-for g in target_groups:
 
-    descriptor = g["descriptor"]
+# ---------------- STEP 2 : Get All Groups ----------------
 
-    body = {
-        "token": f"SecureFile/{project}/{secure_file_id}",
-        "merge": True,
-        "accessControlEntries": [
-            {
-                "descriptor": descriptor,
-                "allow": 1,
-                "deny": 0
-            }
-        ]
-    }
+def get_groups(session, organization):
+    graph_url = f"{VSSPS_URL}/{organization}/_apis/graph/groups?subjectTypes=vssgp&api-version={API_VERSION}"
+    return adoapi.get_all(session, graph_url, verify=False)
 
-    perm_response = requests.post(
-        security_url,
-        headers=headers_json,
-        data=json.dumps(body),
-        verify=False
-    )
 
-    if perm_response.status_code in [200, 201]:
-        print("Permission assigned to:", g["displayName"])
-    else:
-        print("Permission failed:", g["displayName"])
-        print(perm_response.text)
+# ---------------- STEP 4 : Assign Permissions ----------------
 
-print("Script completed successfully")
+def assign_permissions(session, organization, project, secure_file_id, groups):
+    security_url = f"{ADO_URL}/{organization}/_apis/accesscontrolentries/{SECURE_FILE_NAMESPACE}?api-version={API_VERSION}"
+
+    for g in groups:
+        body = {
+            "token": f"SecureFile/{project}/{secure_file_id}",
+            "merge": True,
+            "accessControlEntries": [
+                {
+                    "descriptor": g["descriptor"],
+                    "allow": 1,
+                    "deny": 0
+                }
+            ]
+        }
+
+        perm_response = adoapi.request(
+            session,
+            "POST",
+            security_url,
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(body),
+            verify=False
+        )
+
+        if perm_response.status_code in [200, 201]:
+            print("Permission assigned to:", g["displayName"])
+        else:
+            print("Permission failed:", g["displayName"])
+            print(perm_response.text)
+
+
+def upload_and_grant(organization, project, pat, path):
+    import requests
+    import urllib3
+
+    urllib3.disable_warnings()
+
+    secure_file_name, ciid, environment = parse_secure_file_name(path)
+    print("Secure file name:", secure_file_name)
+    print("CIID:", ciid)
+    print("Environment:", environment)
+
+    session = requests.Session()
+    session.headers["Authorization"] = auth_header(pat)
+
+    secure_file_id = upload_secure_file(session, organization, project, secure_file_name, path)
+    if secure_file_id is None:
+        return False
+
+    # ---------------- STEP 3 : Filter Correct Groups ----------------
+    wanted = set(target_group_names(ciid, environment))
+    target_groups = [g for g in get_groups(session, organization) if g["displayName"] in wanted]
+
+    print("Groups that will be assigned:")
+    for g in target_groups:
+        print(g["displayName"])
+
+    assign_permissions(session, organization, project, secure_file_id, target_groups)
+    print("Script completed successfully")
+    return True
+
+
+if __name__ == "__main__":
+    instrumented(upload_and_grant)(organization, project, pat, file_path)
@@ -0,0 +1,69 @@
+"""Azure DevOps REST calls shared by the admin scripts.
+
+request() retries throttled (429) and unavailable (503) responses after
+the server's Retry-After; get_all() follows x-ms-continuationtoken pages
+and returns every "value" item. Both take a requests.Session or the
+requests module itself as the session. Every response is recorded in
+instrument's timings as "ado <METHOD> <endpoint>".
+"""
+
+import re
+import time
+from urllib.parse import urlsplit
+
+import instrument
+
+MAX_RETRIES = 5
+MAX_RETRY_AFTER = 60
+RETRY_STATUS = (429, 503)
+CONTINUATION_HEADER = "x-ms-continuationtoken"
+
+# Path segments that identify one resource (numbers, GUIDs, descriptors)
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w.$-]{6,}$|^\d+$")
+
+
+def endpoint(url):
+    """The path after _apis/ with resource ids masked: "distributedtask/pools/{id}/jobrequests"."""
+    path = urlsplit(url).path
+    _, _, api_path = path.partition("/_apis/")
+    return "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in (api_path or path).split("/"))
+
+
+def retry_after(response, attempt):
+    try:
+        delay = float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        delay = 2 ** attempt
+    return min(delay, MAX_RETRY_AFTER)
+
+
+def request(session, method, url, retries=MAX_RETRIES, **kwargs):
+    """session.request(method, url, **kwargs), retried while the server throttles."""
+    name = f"ado {method} {endpoint(url)}"
+    for attempt in range(retries + 1):
+        started, start = time.time(), time.perf_counter()
+        response = session.request(method, url, **kwargs)
+        instrument.record(name, time.perf_counter() - start, len(response.content), started)
+        if response.status_code not in RETRY_STATUS or attempt == retries:
+            return response
+        time.sleep(retry_after(response, attempt))
+
+
+def get_json(session, url, params=None, **kwargs):
+    response = request(session, "GET", url, params=params, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_all(session, url, params=None, **kwargs):
+    """GET url and every continuation page; return the concatenated "value" lists."""
+    params = dict(params or {})
+    values = []
+    while True:
+        response = request(session, "GET", url, params=params, **kwargs)
+        response.raise_for_status()
+        values.extend(response.json().get("value", []))
+        token = response.headers.get(CONTINUATION_HEADER)
+        if not token:
+            return values
+        params["continuationToken"] = token
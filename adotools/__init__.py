@@ -0,0 +1,11 @@
+"""Command line entry point for the user/group generation and ADO admin tools.
+
+    python -m adotools <command> [options]
+
+Commands import their dependencies (yaml, requests, pandas, prettytable)
+only when they run, so a step that needs one command does not pay for the
+others. STARTUP_BUDGET_MS is the cold-start budget checked by
+benchmarks/bench_startup.py.
+"""
+
+STARTUP_BUDGET_MS = 60
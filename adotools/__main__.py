@@ -0,0 +1,5 @@
+import sys
+
+from adotools.cli import main
+
+sys.exit(main())
@@ -0,0 +1,185 @@
+"""Subcommands of python -m adotools.
+
+Only argparse, os and sys are imported here. Each handler imports the
+module it drives when it runs.
+"""
+
+import os
+import sys
+import argparse
+
+# The tools are flat modules in the repository root, next to this package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def set_env(name, value):
+    # The generators are configured through pipeline variables; explicit
+    # options override whatever the environment already holds.
+    if value is not None:
+        os.environ[name] = str(value)
+
+
+def generate(args):
+    set_env("computeFilePath", args.computeFilePath)
+    set_env("stateFilePath", args.stateFilePath)
+    set_env("osTypes", args.osTypes)
+    set_env("parallelWorkers", args.workers)
+    set_env("stateDb", args.stateDb)
+    set_env("limit_user_lists", args.limitUsers)
+    set_env("limit_group_lists", args.limitGroups)
+    set_env("limit_compute_config", args.limitComputes)
+    set_env("limit_hostname", args.limitHosts)
+    set_env("pipeline_action", args.pipelineAction)
+    if args.compact:
+        set_env("compactJson", "true")
+    if args.noDedupe:
+        set_env("dedupeNodes", "false")
+
+    import arraymain
+    arraymain.main()
+    return 0
+
+
+def report(args):
+    import json
+    from reports import open_report
+    from summary import summary_sections, write_summary_report
+
+    with open(args.summary) as summary_file:
+        data = json.load(summary_file)
+
+    sections = summary_sections()
+    name = os.path.splitext(os.path.basename(args.summary))[0]
+    backend = open_report(name, sections, args.format, args.reportDir)
+    write_summary_report(data, backend, sections)
+    backend.close()
+    return 0
+
+
+def pool_jobs(args):
+    import Pool
+
+    pat = os.getenv(args.patEnv)
+    if not pat:
+        print(f"Error: set the {args.patEnv} environment variable.")
+        return 1
+    Pool.export_pool_jobs(pat, args.org, args.project, args.poolId, args.hours, args.out)
+    return 0
+
+
+def ciid_audit(args):
+    import Getciidandenv
+
+    args.pat = args.pat or os.getenv("AZDO_PAT")
+    if not args.org or not args.project or not args.pat:
+        print("Error: provide --org, --project and --pat, or set AZDO_ORG, AZDO_PROJECT, AZDO_PAT.")
+        return 1
+    Getciidandenv.main(args)
+    return 0
+
+
+def ciid(args):
+    import ciid
+
+    if not args.repoFile:
+        args.pat = args.pat or os.getenv("AZDO_PAT")
+        if not args.org or not args.project or not args.pat:
+            print("Error: provide --repoFile, or --org, --project and --pat (AZDO_ORG, AZDO_PROJECT, AZDO_PAT).")
+            return 1
+    return ciid.main(args)
+
+
+def securefile(args):
+    import Update08
+
+    pat = os.getenv(args.patEnv)
+    if not pat:
+        print(f"Error: set the {args.patEnv} environment variable.")
+        return 1
+    return 0 if Update08.upload_and_grant(args.org, args.project, pat, args.file) else 1
+
+
+def repo_sync(args):
+    import reposync
+    failed = reposync.sync_repositories(args.remotes, args.source, os.getenv(args.patEnv), args.tags, args.workers)
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="adotools", description="User/group payload generation and ADO admin tools")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    cmd = commands.add_parser("generate", help="Write the Windows/RHEL user and group payloads")
+    cmd.add_argument("--computeFilePath", help="compute_mf.yml (default: $computeFilePath)")
+    cmd.add_argument("--stateFilePath", help="State JSON file or glob (default: $stateFilePath)")
+    cmd.add_argument("--osTypes", help="Comma separated payload targets: windows, linux")
+    cmd.add_argument("--workers", type=int, help="Build Windows payloads in a process pool")
+    cmd.add_argument("--stateDb", help="SQLite record of generated state")
+    cmd.add_argument("--limitUsers", help="limit_user_lists")
+    cmd.add_argument("--limitGroups", help="limit_group_lists")
+    cmd.add_argument("--limitComputes", help="limit_compute_config")
+    cmd.add_argument("--limitHosts", help="limit_hostname")
+    cmd.add_argument("--pipelineAction", help="Prefix of RHEL task arguments")
+    cmd.add_argument("--compact", action="store_true", help="Write payloads without indentation")
+    cmd.add_argument("--noDedupe", action="store_true", help="Keep one entry per compute")
+    cmd.set_defaults(handler=generate)
+
+    cmd = commands.add_parser("report", help="Render a change summary as text, table, jsonl, csv or html")
+    cmd.add_argument("summary", nargs="?", default="change_summary.json", help="Summary written by the generators")
+    cmd.add_argument("--format", default=None, help="Comma separated formats (default: $reportFormat or text)")
+    cmd.add_argument("--reportDir", default=None, help="Directory for file formats (default: $reportDir or .)")
+    cmd.set_defaults(handler=report)
+
+    cmd = commands.add_parser("pool-jobs", help="Export agent pool job requests to CSV")
+    cmd.add_argument("--org", required=True, help="Azure DevOps organization")
+    cmd.add_argument("--project", help="Project (omit for the organization-level pool endpoint)")
+    cmd.add_argument("--poolId", type=int, required=True, help="Agent pool ID")
+    cmd.add_argument("--hours", type=float, default=24, help="Only jobs assigned in the last N hours")
+    cmd.add_argument("--out", default="agent_pool_jobs.csv", help="Output CSV file")
+    cmd.add_argument("--patEnv", default="ADO_PAT", help="Environment variable holding the PAT")
+    cmd.set_defaults(handler=pool_jobs)
+
+    cmd = commands.add_parser("ciid-audit", help="Export repos, CIIDs and production_v2 environments")
+    cmd.add_argument("--org", default=os.environ.get("AZDO_ORG"), help="Azure DevOps organization")
+    cmd.add_argument("--project", default=os.environ.get("AZDO_PROJECT"), help="Azure DevOps project")
+    cmd.add_argument("--pat", help="Personal Access Token (default: $AZDO_PAT)")
+    cmd.add_argument("--out", default="ado_repos_production_v2.xlsx", help="Output Excel file")
+    cmd.set_defaults(handler=ciid_audit)
+
+    cmd = commands.add_parser("ciid", help="Extract CIIDs from xlsx/CSV files and match them to repos, pipelines, environments")
+    cmd.add_argument("inputs", nargs="+", help="xlsx or CSV files holding CIIDs or names containing them")
+    cmd.add_argument("--column", help="Column name or index (default: first CIID/name-like column)")
+    cmd.add_argument("--sheet", help="Worksheet (default: the first)")
+    cmd.add_argument("--org", default=os.environ.get("AZDO_ORG"), help="Azure DevOps organization")
+    cmd.add_argument("--project", default=os.environ.get("AZDO_PROJECT"), help="Azure DevOps project")
+    cmd.add_argument("--pat", help="Personal Access Token (default: $AZDO_PAT)")
+    cmd.add_argument("--repoFile", help="Exported repository listing to use instead of the live project")
+    cmd.add_argument("--pipelineFile", help="Exported pipeline listing (with --repoFile)")
+    cmd.add_argument("--environmentFile", help="Exported environment listing (with --repoFile)")
+    cmd.add_argument("--out", default="ciid_reconciliation.xlsx", help="Output .xlsx or .csv file")
+    cmd.set_defaults(handler=ciid)
+
+    cmd = commands.add_parser("securefile", help="Upload a secure file and grant its CIID groups access")
+    cmd.add_argument("file", help="File named <ciid>-<name>[-NON_PROD]...")
+    cmd.add_argument("--org", required=True, help="Azure DevOps organization")
+    cmd.add_argument("--project", required=True, help="Azure DevOps project")
+    cmd.add_argument("--patEnv", default="ADO_PAT", help="Environment variable holding the PAT")
+    cmd.set_defaults(handler=securefile)
+
+    cmd = commands.add_parser("repo-sync", help="Push a repository to several remotes")
+    cmd.add_argument("remotes", nargs="+", help="Remote repository URLs")
+    cmd.add_argument("--source", default=".", help="Local repository to push from")
+    cmd.add_argument("--patEnv", default="PAT", help="Environment variable holding the PAT")
+    cmd.add_argument("--tags", action="store_true", help="Push tags as well")
+    cmd.add_argument("--workers", type=int, default=4, help="Remotes pushed concurrently")
+    cmd.set_defaults(handler=repo_sync)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Imported after parsing so --help stays fast; nested entry points defer to this one
+    from instrument import instrumented
+    return instrumented(args.handler)(args)
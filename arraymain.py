@@ -3,19 +3,33 @@ import yaml
 import json
 import traceback
 from glob import glob
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from prettytable import PrettyTable
+from membership import MembershipDelta
+from payload import EscapedBlob, NodeList, NodeListWriter
+from statestore import StateStore, config_hash
+from limits import Limits
+from manifest import Group, parse_computes
+from instrument import timed, instrumented, file_size
+from pipelinelog import log
+
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 class YamlLoader:
     @staticmethod
+    @timed('yaml.load', size=file_size)
     def load(file_path):
         try:
             with open(file_path, 'r') as file:
-                return yaml.safe_load(file)
+                # libyaml's loader when PyYAML was built with it; same documents, several times faster
+                return yaml.load(file, Loader=SafeLoader)
         except Exception:
             raise ValueError(f'Error loading YAML file: {file_path}')
 
 class JsonLoader:
     @staticmethod
+    @timed('json.load', size=file_size)
     def load(file_path):
         try:
             with open(file_path, 'r') as file:
@@ -23,195 +37,404 @@ class JsonLoader:
         except Exception:
             raise ValueError(f'Error loading JSON file: {file_path}')
 
+# Estates repeat a handful of os strings across thousands of computes
+@lru_cache(maxsize=None)
+def classify_os(value):
+    value = value.upper()
+    if 'W2K' in value:
+        return 'windows'
+    elif 'RHEL' in value:
+        return 'linux'
+    else:
+        return 'unknown'
+
 class Parser:
+    def __init__(self, limits=None):
+        self.limits = limits or Limits()
+        self.nginx_computes = []
+
     def parse_os_name(self, value):
-        value = value.upper()
-        if 'W2K' in value:
-            return 'windows'
-        elif 'RHEL' in value:
-            return 'linux'
-        else:
-            return 'unknown'
+        return classify_os(value)
 
+    @timed('parse_compute')
     def parse_compute(self, computeFilePath):
-        print(f'Parsing file: {computeFilePath}')
+        log.info(f'Parsing file: {computeFilePath}')
         data = {}
         yaml_loader = YamlLoader()
         compute_mf = yaml_loader.load(computeFilePath)
 
         if compute_mf:
-            computes = compute_mf.get('compute-config', [])
-            for compute in computes:
-                compute_name = compute['name'].lower()
-                os_type = self.parse_os_name(compute['os']).lower()
-                data[compute_name] = {
-                    'os': os_type,
-                    'os_groups': compute.get('win-os-groups', []),
-                    'os_users': compute.get('win-os-accounts', [])
-                }
+            limits = self.limits
+            # Raises ManifestError listing every invalid entry before anything is generated
+            data = parse_computes(compute_mf.get('compute-config', []), self.parse_os_name, limits, computeFilePath)
+            for compute in data.values():
+                compute.accounts = self.limit_users(compute.accounts)
+                compute.groups = self.limit_groups(compute.groups, members=True)
+                compute.rhel_users = self.limit_users(compute.rhel_users)
+                compute.rhel_groups = self.limit_groups(compute.rhel_groups)
+            self.nginx_computes = [item['name'].lower() for item in compute_mf.get('nginx-lb-config') or []
+                                   if limits.computes(item['name'])]
         return data
 
+    # Users and groups outside the limits are dropped here, before any payload
+    # is built; None (key missing or null) is kept so it can still be reported.
+    def limit_users(self, users):
+        if not users or self.limits.users.match_all:
+            return users
+        return tuple(user for user in users if self.limits.users(user.name))
+
+    def limit_groups(self, groups, members=False):
+        if not groups or (self.limits.groups.match_all and (not members or self.limits.users.match_all)):
+            return groups
+        groups = [group for group in groups if self.limits.groups(group.name)]
+        if members and not self.limits.users.match_all:
+            groups = [Group(group.name, group.description, tuple(self.limits.users.filter(group.members)), group.action)
+                      for group in groups]
+        return tuple(groups)
+
+    @timed('parse_state')
     def parse_state(self, stateFilePath):
-        print(f'Parsing file: {stateFilePath[0]}')
+        log.info(f'Parsing file: {stateFilePath[0]}')
         data = {}
         json_loader = JsonLoader()
         state_file = json_loader.load(stateFilePath[0])
 
         if state_file:
             compute_configs = state_file.get('compute_configs', [])
+            limits = self.limits
             for compute in compute_configs:
-                compute_name = compute['name'].lower()
-                hostnames = compute.get('hostnames', [])  
-                data[compute_name] = hostnames
+                # RHEL state files key computes by name_mf and list hosts under vm_states
+                compute_name = compute.get('name_mf', compute.get('name')).lower()
+                if not limits.computes(compute_name):
+                    continue
+                if 'hostnames' in compute:
+                    hostnames = compute['hostnames']
+                else:
+                    hostnames = self.vm_hostnames(compute_name, compute.get('vm_states') or [])
+                hostnames = limits.hosts.filter(hostnames)
+                if hostnames:
+                    data[compute_name] = hostnames
 
         return data
 
+    # vm_states[].ip_addresses[0].host_record_name; entries without one are
+    # skipped (the jq loop this replaced produced null for them)
+    def vm_hostnames(self, compute_name, vm_states):
+        hostnames = []
+        for index, vm in enumerate(vm_states):
+            ip_addresses = vm.get('ip_addresses') if isinstance(vm, dict) else None
+            first = ip_addresses[0] if isinstance(ip_addresses, list) and ip_addresses else None
+            hostname = first.get('host_record_name') if isinstance(first, dict) else None
+            if hostname:
+                hostnames.append(hostname)
+            else:
+                log.warning(f'No host_record_name in vm_states[{index}] of compute-name: {compute_name}. Skipping...',
+                            compute=compute_name)
+        return hostnames
+
 class Report:
     def __init__(self):
         self.data = {}
 
+    @timed('report')
     def print_data(self):
         t1 = PrettyTable(['Hosts'])
         for host in self.data.get('hostnames', []):
             t1.add_row([host])
-        print(t1)
+        log.write(str(t1))
 
-        print('Added Users:')
+        log.write('Added Users:')
         t2 = PrettyTable(['User', 'Group'])
         for user in self.data.get('added_users', []):
             groups = ', '.join(self.data.get('added_groups', {}).get(user, []))
             t2.add_row([user, groups])
-        print(t2)
+        log.write(str(t2))
 
-        print('Removed Users:')
+        log.write('Removed Users:')
         t3 = PrettyTable(['User', 'Group'])
         for user in self.data.get('removed_users', []):
             groups = ', '.join(self.data.get('removed_users', {}).get(user, []))
             t3.add_row([user, groups])
-        print(t3)
+        log.write(str(t3))
 
     def set_data(self, value):
         self.data = value
 
-def generate_json(compute_data, state_data, target_hosts):
+OS_TARGETS = ("windows", "linux")
+
+@timed('generate_json')
+def generate_json(compute_data, state_data, os_types=OS_TARGETS, dedupe=True, compact=False, workers=0, state_store=None,
+                  nginx_computes=(), pipeline_action="create", limits=None, build_id=0, artifact_url=""):
+    """Route every compute to its OS emitter in one pass and write the payloads of each target in os_types.
+
+    Returns the number of listOfNodes entries written per payload file.
+    """
+    routed, nginx_hosts = route_computes(compute_data, state_data, os_types, nginx_computes)
+
+    counts = {}
+    if "windows" in routed:
+        counts.update(generate_windows_json(compute_data, routed["windows"], dedupe, compact, workers, state_store))
+    if "linux" in routed:
+        counts.update(generate_rhel_json(compute_data, routed["linux"], nginx_hosts, pipeline_action, limits or Limits(),
+                                         build_id, artifact_url, dedupe, compact))
+
+    log.info("JSON files created successfully!")
+    return counts
+
+def route_computes(compute_data, state_data, os_types, nginx_computes=()):
+    """Split the computes of the state file by OS target.
+
+    Returns ({os_type: [(compute_name, hostnames), ...]}, nginx_hosts); the
+    nginx-lb-config hosts are only collected when linux is a target.
+    """
+    routed = {os_type: [] for os_type in os_types}
+    collect_nginx = "linux" in routed and nginx_computes
+    nginx_hosts = []
+
+    for compute_name, hostnames in state_data.items():
+        # Load balancers are usually listed only under nginx-lb-config, so
+        # their hosts come from the state file whether or not compute-config has them
+        if collect_nginx and compute_name in nginx_computes:
+            nginx_hosts.extend(hostnames)
+
+        compute = compute_data.get(compute_name)
+        if compute is None:
+            continue
+
+        os_type = compute.os
+        selected = routed.get(os_type)
+        if selected is None:
+            log.warning(f'{compute_name} has OS type {os_type}, which is not being generated. Skipping...', compute=compute_name)
+            continue
+        selected.append((compute_name, hostnames))
+
+    return routed, nginx_hosts
+
+def generate_windows_json(compute_data, selected, dedupe=True, compact=False, workers=0, state_store=None):
     user_json = {
         "deploy_artifact": "https://artifactory.global.standardchartered.com/artifactory/generic-sc-release_lo",
         "script": "win_user_action.ps1",
         "build_id": 856825,
-        "build_local_path": "create-group-win-ps1",
-        "listOfNodes": []
+        "build_local_path": "create-group-win-ps1"
     }
 
     group_json = {
         "deploy_artifact": "https://artifactory.global.standardchartered.com/artifactory/generic-sc-release_lo",
         "script": "win_group_action.ps1",
         "build_id": 856825,
-        "build_local_path": "create-group-win-ps1",
-        "listOfNodes": []
+        "build_local_path": "create-group-win-ps1"
     }
 
-    for compute_name, hostnames in state_data.items():
-        if compute_name not in compute_data:
-            continue
-
-        if target_hosts and not any(host in target_hosts for host in hostnames):
-            continue  # Skip hosts not in the target list
-
-        os_type = compute_data[compute_name].get("os", "")
-        if os_type != "windows":
-            print(f'##vso[task.logissue type=warning]{compute_name} is not a Windows machine. Skipping...')
-            continue
-
-        print(f'Processing Host: {compute_name} | Hostnames: {hostnames}')
-
-        added_users = []
-        added_groups = {}
-
-        user_args = []
-        group_args = []
-
-        add_users_data = []
-        add_groups_data = []
-        existing_groups = []
-        modified_groups = []
-
-        if compute_data[compute_name]["os_users"]:
-            for user in compute_data[compute_name]["os_users"]:
-                username = user['account-name']
-                description = user['account-desc']
-                rdp = 'true' if user['logon-type'] == 'rdp' else 'false'
-
-                if username not in added_users:
-                    added_users.append(username)
-
-                user_args.append(f"create {username}|{description}")
-                add_users_data.append({"username": username, "description": description, "rdp": rdp})
-
-        if compute_data[compute_name]["os_groups"]:
-            for group in compute_data[compute_name]["os_groups"]:
-                group_name = group['group-name']
-                description = group['group-desc']
-                user_list = group['user-list']
-                user_list_action = group['user-list-action']
-
-                for user in user_list:
-                    if user_list_action == 'add':
-                        if group_name not in added_groups.setdefault(user, []):
-                            added_groups[user].append(group_name)
-                    elif user_list_action == 'remove':
-                        added_groups.setdefault(user, []).remove(group_name)
-
-                group_args.append(f"create {group_name}|{description}")
-                add_groups_data.append({"group_name": group_name, "description": description, "user_list": user_list, "user_list_action": user_list_action})
-
-        escaped_add_users_data = json.dumps(add_users_data).replace('"', '\\"')
-        escaped_add_groups_data = json.dumps(add_groups_data).replace('"', '\\"')
-        escaped_existing_groups_data = json.dumps(existing_groups).replace('"', '\\"')
-        escaped_modified_groups = json.dumps(modified_groups).replace('"', '\\"')
-
-        user_json["listOfNodes"].append({
-            "targetNodes": ",".join(hostnames),
-            "task arguments": " ".join(user_args),
-            "add_users_data": escaped_add_users_data
-        })
-
-        group_json["listOfNodes"].append({
-            "targetNodes": ",".join(hostnames),
-            "task arguments": " ".join(group_args),
-            "add_groups_data": escaped_add_groups_data
-        })
-
-    with open("windows_users.json", "w") as user_file:
-        json.dump(user_json, user_file, indent=4)
-
-    with open("windows_groups.json", "w") as group_file:
-        json.dump(group_json, group_file, indent=4)
+    with NodeListWriter("windows_users.json", user_json, compact) as user_writer, \
+            NodeListWriter("windows_groups.json", group_json, compact) as group_writer:
+        user_nodes = NodeList(user_writer.write, dedupe)
+        group_nodes = NodeList(group_writer.write, dedupe)
+        generated = generate_nodes(compute_data, selected, user_nodes, group_nodes, workers, state_store)
+        user_nodes.flush()
+        group_nodes.flush()
+
+    if state_store is not None:
+        for compute_name, hostnames, desired_hash, delta in generated:
+            added, _ = delta.diff()
+            # Nothing is applied yet; Azure-pipeline.yml confirms it with statestore.py --confirm after Puppet succeeds
+            state_store.stage(compute_name, hostnames, desired_hash, delta.users, added, 'generate_json')
+
+    return {"windows_users.json": user_writer.count, "windows_groups.json": group_writer.count}
+
+def generate_nodes(compute_data, windows_selected, user_nodes, group_nodes, workers=0, state_store=None):
+    selected = []
+    desired_hashes = {}
+    for compute_name, hostnames in windows_selected:
+        if state_store is not None:
+            desired_hashes[compute_name] = config_hash(compute_data[compute_name].desired_state())
+            if not state_store.changed_hosts(compute_name, hostnames, desired_hashes[compute_name]):
+                log.info(f'Skipping {compute_name}: desired state unchanged since last run', compute=compute_name)
+                continue
+
+        selected.append((compute_name, hostnames))
+
+    windows_computes = [compute_data[compute_name] for compute_name, _ in selected]
+
+    # Workers only build payloads; entries are merged here in state file
+    # order so the output matches the serial path byte for byte.
+    if workers > 1 and len(windows_computes) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(windows_computes) // (workers * 4))
+        payloads = pool.map(build_compute_payloads, windows_computes, chunksize=chunksize)
+    else:
+        pool = None
+        payloads = map(build_compute_payloads, windows_computes)
+
+    generated = []
+    try:
+        for compute_name, hostnames in selected:
+            log.info(f'Processing Host: {compute_name} | Hostnames: {hostnames}', compute=compute_name)
+
+            user_payload, group_payload, delta = next(payloads)
+            user_nodes.add(hostnames, user_payload)
+            group_nodes.add(hostnames, group_payload)
+            if state_store is not None:
+                generated.append((compute_name, hostnames, desired_hashes[compute_name], delta))
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return generated
+
+def build_compute_payloads(compute):
+    delta = MembershipDelta()
+
+    user_args = []
+    group_args = []
+
+    add_users_data = []
+    add_groups_data = []
+
+    for account in compute.accounts:
+        delta.add_user(account.name)
+
+        user_args.append(f"create {account.name}|{account.description}")
+        add_users_data.append({"username": account.name, "description": account.description,
+                               "rdp": 'true' if account.rdp else 'false'})
+
+    for group in compute.groups:
+        delta.apply(group.name, group.members, group.action)
+
+        group_args.append(f"create {group.name}|{group.description}")
+        add_groups_data.append({"group_name": group.name, "description": group.description, "user_list": group.members, "user_list_action": group.action})
+
+    user_payload = {
+        "task arguments": " ".join(user_args),
+        "add_users_data": EscapedBlob.dumps(add_users_data)
+    }
 
-    print("JSON files created successfully!")
+    group_payload = {
+        "task arguments": " ".join(group_args),
+        "add_groups_data": EscapedBlob.dumps(add_groups_data)
+    }
 
-try:
-    parser = Parser()
+    return user_payload, group_payload, delta
 
-    computeFilePath = os.getenv("computeFilePath")
-    stateFilePath = os.getenv("stateFilePath")
-    targetHostnames = os.getenv("targetHostnames")  # New variable for filtering
+RHEL_NGINX_USER = "create|nginxadm|5545|5545||/home/nginxadm"
+RHEL_NGINX_GROUP = "create|nginxadm|5545"
 
-    compute_data = parser.parse_compute(computeFilePath)
-    state_data = parser.parse_state(glob(stateFilePath))
+def generate_rhel_json(compute_data, selected, nginx_hosts, pipeline_action, limits, build_id, artifact_url,
+                       dedupe=True, compact=False):
+    user_json = {
+        "deploy_artifact": artifact_url,
+        "script": "rhel_user_action.sh",
+        "build_id": build_id,
+        "build_local_path": "/tmp"
+    }
 
-    target_hosts_list = targetHostnames.split(",") if targetHostnames else []
+    group_json = {
+        "deploy_artifact": artifact_url,
+        "script": "rhel_group_action.sh",
+        "build_id": build_id,
+        "build_local_path": "/tmp"
+    }
 
-    generate_json(compute_data, state_data, target_hosts_list)
+    with NodeListWriter("rhel_user_input.json", user_json, compact) as user_writer, \
+            NodeListWriter("rhel_group_input.json", group_json, compact) as group_writer:
+        user_nodes = NodeList(user_writer.write, dedupe)
+        group_nodes = NodeList(group_writer.write, dedupe)
+
+        # Computes, hosts, users and groups are already narrowed to the limits by the Parser
+        for compute_name, hosts in selected:
+            compute = compute_data[compute_name]
+            log.info(f'Processing Host: {compute_name} | Hostnames: {hosts}', compute=compute_name)
+
+            user_args, group_args = build_rhel_task_arguments(compute_name, compute, pipeline_action, limits)
+            if group_args:
+                group_nodes.add(hosts, {"taskArguments": " ".join(group_args)})
+            if user_args:
+                user_nodes.add(hosts, {"taskArguments": " ".join(user_args)})
+
+        if nginx_hosts:
+            user_nodes.add(nginx_hosts, {"taskArguments": RHEL_NGINX_USER})
+            group_nodes.add(nginx_hosts, {"taskArguments": RHEL_NGINX_GROUP})
+
+        user_nodes.flush()
+        group_nodes.flush()
+
+    return {"rhel_user_input.json": user_writer.count, "rhel_group_input.json": group_writer.count}
+
+def build_rhel_task_arguments(compute_name, compute, pipeline_action, limits):
+    user_args = []
+    group_args = []
+
+    if limits.groups.skip:
+        log.warning(f'Skipping group creation step for compute-name: {compute_name}', compute=compute_name)
+    elif compute.rhel_groups is None:
+        log.warning(f'No os-groups found for compute-name: {compute_name}', compute=compute_name)
+    else:
+        for group in compute.rhel_groups:
+            group_args.append(f"{pipeline_action}|{group.name}|{group.gid or ''}")
+
+    if limits.users.skip:
+        log.warning(f'Skipping user creation step for compute-name: {compute_name}', compute=compute_name)
+    elif compute.rhel_users is None:
+        log.warning(f'No os-users found for compute-name: {compute_name}', compute=compute_name)
+    else:
+        for user in compute.rhel_users:
+            secondary_gids = ",".join(str(gid) for gid in user.secondary_gids)
+            user_args.append(f"{pipeline_action}|{user.name}|{user.uid or ''}|{user.gid or ''}|"
+                             f"{secondary_gids}|{user.home or ''}")
+
+    return user_args, group_args
+
+@instrumented
+def main():
+    try:
+        limits = Limits.from_env()  # limit_user_lists, limit_group_lists, limit_compute_config, limit_hostname
+        parser = Parser(limits)
+
+        computeFilePath = os.getenv("computeFilePath")
+        stateFilePath = os.getenv("stateFilePath")
+        dedupeNodes = os.getenv("dedupeNodes", "true")  # Merge computes with identical payloads (held until the end instead of streamed)
+        compactJson = os.getenv("compactJson", "false")  # Write payloads without indentation
+        parallelWorkers = os.getenv("parallelWorkers", "0")  # Build compute payloads in a process pool
+        stateDb = os.getenv("stateDb")  # SQLite record of applied state; unchanged computes are skipped, generated ones staged
+        osTypes = os.getenv("osTypes", "windows,linux")  # Comma separated payload targets
+
+        compute_data = parser.parse_compute(computeFilePath)
+        state_data = parser.parse_state(glob(stateFilePath))
+
+        os_types = [item.strip().lower() for item in osTypes.split(",") if item.strip()]
+
+        state_store = StateStore(stateDb) if stateDb else None
+        counts = generate_json(compute_data, state_data, os_types, dedupeNodes.lower() != "false",
+                               compactJson.lower() == "true", int(parallelWorkers or 0), state_store,
+                               parser.nginx_computes, os.getenv("pipeline_action", "create"), limits,
+                               int(os.getenv("BUILD_BUILDID", "0")), os.getenv("artifactoryUrlToFile", ""))
+        if state_store is not None:
+            state_store.close()
+
+        for file_name, count in counts.items():
+            log.info(f"{file_name}: {count} nodes")
+
+        if "linux" in os_types:
+            rhel_user_exist = str(counts["rhel_user_input.json"] > 0).lower()
+            rhel_group_exist = str(counts["rhel_group_input.json"] > 0).lower()
+            log.write("##vso[task.setvariable variable=rhel_user_input;isOutput=true]rhel_user_input.json")
+            log.write(f"##vso[task.setvariable variable=rhel_user_exist;isOutput=true]{rhel_user_exist}")
+            log.write("##vso[task.setvariable variable=rhel_group_input;isOutput=true]rhel_group_input.json")
+            log.write(f"##vso[task.setvariable variable=rhel_group_exist;isOutput=true]{rhel_group_exist}")
+
+        report = Report()
+        report.set_data({
+            'hostnames': state_data,
+            'added_users': [],
+            'added_groups': {},
+            'removed_users': {}
+        })
+        report.print_data()
 
-    report = Report()
-    report.set_data({
-        'hostnames': state_data,
-        'added_users': [],
-        'added_groups': {},
-        'removed_users': {}
-    })
-    report.print_data()
+    except Exception as e:
+        log.error(f' {traceback.format_exc()}')
+        log.write(f'##vso[task.complete result=SucceededWithIssues;] Task completed with warnings')
+    finally:
+        log.close()
 
-except Exception as e:
-    print(f'##vso[task.logissue type=error] {traceback.format_exc()}')
-    print(f'##vso[task.complete result=SucceededWithIssues;] Task completed with warnings')
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Measure the ADO REST clients end to end against benchmarks/mock_ado.py.
+
+Scenarios: Getciidandenv.get_all_repos and get_all_environments,
+Pool.fetch_job_requests, and Update08.upload_and_grant (upload, group
+lookup, one ACE per matching group). Each scenario makes --calls client
+calls from --concurrency threads; the server's latency, throttling and
+page size come from the mock_ado options. Results report calls/s,
+server requests/s, 429s absorbed and bytes, and can be compared with an
+earlier run like bench_pipeline.py results.
+
+Usage:
+    python benchmarks/bench_ado.py --latency 20 --throttle 0.05 --pageSize 100 --concurrency 8
+    python benchmarks/bench_ado.py --latency 20 --concurrency 8 --compare ado.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import itertools
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_ado import MockAdoServer, add_arguments, from_arguments
+from bench_pipeline import compare, git_revision
+
+ORG = 'bench-org'
+PROJECT = 'bench-project'
+PAT = 'bench-pat'
+
+
+def client_scenarios(server, workdir):
+    """Return [(name, callable(call_index) -> items handled)] pointed at server."""
+    import Getciidandenv
+    import Pool
+    import Update08
+
+    Getciidandenv.BASE_URL = Pool.BASE_URL = server.url
+    Update08.ADO_URL = Update08.VSSPS_URL = server.url
+    ciids = sorted({group['displayName'].split('-')[1] for group in server.ado.groups})
+    uploads = itertools.count()  # secure file names must stay unique across repeats
+
+    def repos(_):
+        return len(Getciidandenv.get_all_repos(ORG, PROJECT, PAT))
+
+    def environments(_):
+        return len(Getciidandenv.get_all_environments(ORG, PROJECT, PAT))
+
+    def pool_jobs(_):
+        return len(Pool.fetch_job_requests(Pool.job_requests_url(ORG, PROJECT, 1), PAT))
+
+    def securefile(_):
+        index = next(uploads)
+        path = os.path.join(workdir, f'{ciids[index % len(ciids)]}-bench{index:05d}-NON_PROD.txt')
+        with open(path, 'w') as secure_file:
+            secure_file.write('secret\n')
+        return 1 if Update08.upload_and_grant(ORG, PROJECT, PAT, path) else 0
+
+    return [('repos', repos), ('environments', environments), ('pool_jobs', pool_jobs), ('securefile', securefile)]
+
+
+def run_scenario(scenario, calls, concurrency):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            items = sum(pool.map(scenario, range(calls)))
+        return time.perf_counter() - start, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ADO REST clients against a mock server')
+    add_arguments(parser)
+    parser.add_argument('--calls', type=int, default=20, help='Client calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenarios', help='Comma separated subset of repos,environments,pool_jobs,securefile')
+    parser.add_argument('--out', help='Write results JSON here')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('out', 'compare')},
+        'stages': {}
+    }
+    wanted = set(args.scenarios.split(',')) if args.scenarios else None
+
+    with MockAdoServer(from_arguments(args)) as server, tempfile.TemporaryDirectory() as workdir:
+        for name, scenario in client_scenarios(server, workdir):
+            if wanted and name not in wanted:
+                continue
+            seconds = []
+            for _ in range(args.repeat):
+                server.ado.reset_stats()
+                elapsed, items = run_scenario(scenario, args.calls, args.concurrency)
+                seconds.append(elapsed)
+            stats = server.ado.stats()
+            requests = sum(stats['requests'].values())
+            median = statistics.median(seconds)
+            results['stages'][name] = {
+                'median_s': median,
+                'min_s': min(seconds),
+                'samples_s': seconds,
+                'calls_per_s': round(args.calls / median, 1),
+                'items': items,
+                'requests': requests,
+                'requests_per_s': round(requests / seconds[-1], 1),
+                'throttled': sum(stats['throttled'].values()),
+                'bytes_sent': stats['bytes_sent'],
+                'bytes_received': stats['bytes_received']
+            }
+
+    print(f"{args.calls} calls x {args.concurrency} threads, latency {args.latency:g} ms, "
+          f"throttle {args.throttle:g}, page size {args.pageSize}")
+    for name, stage in results['stages'].items():
+        print(f"{name:15} {stage['median_s']:9.3f}s median {stage['calls_per_s']:9.1f} calls/s "
+              f"{stage['requests_per_s']:9.1f} req/s {stage['throttled']:6d} x 429 {stage['bytes_sent']:10d} B")
+
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            json.dump(results, out_file, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
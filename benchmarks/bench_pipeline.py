@@ -0,0 +1,152 @@
+"""Time each stage of the manifest-to-payload pipeline on a synthetic estate.
+
+Stages: Parser.parse_compute, Parser.parse_state, generate_json (all four
+payloads) and Report.print_data from arraymain.py. Each stage is timed
+--repeat times; a separate tracemalloc pass records its peak memory, so
+tracing does not distort the timings. Results are written as JSON and
+can be compared with an earlier run.
+
+Usage:
+    python benchmarks/bench_pipeline.py --computes 2000 --hosts 4 --out results.json
+    python benchmarks/bench_pipeline.py --computes 2000 --hosts 4 --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from estate import add_arguments, write_estate
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def pipeline_stages(compute_path, state_path, workers):
+    """Return [(name, callable)]; each callable runs its stage on the previous stages' results."""
+    import arraymain
+
+    results = {}
+    parser = arraymain.Parser()
+
+    def parse_compute():
+        results['compute_data'] = parser.parse_compute(compute_path)
+
+    def parse_state():
+        results['state_data'] = parser.parse_state([state_path])
+
+    def generate_json():
+        arraymain.generate_json(results['compute_data'], results['state_data'], workers=workers,
+                                nginx_computes=parser.nginx_computes)
+
+    def print_report():
+        report = arraymain.Report()
+        report.set_data({'hostnames': results['state_data'], 'added_users': [], 'added_groups': {}, 'removed_users': {}})
+        report.print_data()
+
+    return [('parse_compute', parse_compute), ('parse_state', parse_state),
+            ('generate_json', generate_json), ('report', print_report)]
+
+
+def run_stages(stages, trace=False):
+    from pipelinelog import log
+
+    timings = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, stage in stages:
+            if trace:
+                tracemalloc.start()
+            start = time.perf_counter()
+            stage()
+            elapsed = time.perf_counter() - start
+            if trace:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                timings[name] = peak
+            else:
+                timings[name] = elapsed
+        # The pipeline log buffers console lines; write them while stdout is still redirected
+        log.flush()
+    return timings
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nvs {baseline_path} ({baseline.get('revision', '?')}):")
+    for name, stage in results['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if not old:
+            continue
+        ratio = stage['median_s'] / old['median_s'] if old['median_s'] else float('inf')
+        print(f"{name:15} {old['median_s']:9.3f}s -> {stage['median_s']:9.3f}s  x{ratio:5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the manifest-to-payload pipeline')
+    add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0, help='parallelWorkers for generate_json')
+    parser.add_argument('--noMemory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--out', help='Write results JSON here')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        compute_path, state_path = write_estate(workdir, args.computes, args.hosts, args.users, args.groups,
+                                                args.roster, args.linuxRatio, args.profiles, args.seed)
+        cwd = os.getcwd()
+        os.chdir(workdir)  # generate_json writes its payloads to the working directory
+        try:
+            samples = [run_stages(pipeline_stages(compute_path, state_path, args.workers)) for _ in range(args.repeat)]
+            peaks = {} if args.noMemory else run_stages(pipeline_stages(compute_path, state_path, args.workers), trace=True)
+            payload_bytes = {name: os.path.getsize(name) for name in sorted(os.listdir(workdir)) if name.endswith('.json')}
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('out', 'compare')},
+        'payload_bytes': payload_bytes,
+        'stages': {}
+    }
+    for name in samples[0]:
+        seconds = [sample[name] for sample in samples]
+        results['stages'][name] = {
+            'median_s': statistics.median(seconds),
+            'min_s': min(seconds),
+            'samples_s': seconds,
+            'peak_kib': round(peaks[name] / 1024, 1) if name in peaks else None
+        }
+
+    print(f"{args.computes} computes x {args.hosts} hosts, {args.users} users, {args.groups} groups, roster {args.roster}")
+    for name, stage in results['stages'].items():
+        peak = f"{stage['peak_kib']:10.0f} KiB peak" if stage['peak_kib'] is not None else ''
+        print(f"{name:15} {stage['median_s']:9.3f}s median {stage['min_s']:9.3f}s min {peak}")
+
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            json.dump(results, out_file, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
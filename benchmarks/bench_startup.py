@@ -0,0 +1,75 @@
+"""Measure the cold start of python -m adotools against STARTUP_BUDGET_MS.
+
+The overhead is the median wall time of `python -m adotools --help` minus
+that of a bare interpreter. The run fails if the overhead is over budget
+or if importing the CLI pulls in any of the heavy dependencies.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from adotools import STARTUP_BUDGET_MS
+
+HEAVY_MODULES = ("yaml", "requests", "urllib3", "pandas", "prettytable", "openpyxl", "sqlite3", "asyncio")
+
+
+def wall_time(command, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def loaded_heavy_modules():
+    probe = (f"import sys, adotools.cli; "
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return [name for name in output.strip().split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="Allowed overhead in milliseconds")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    baseline = wall_time([sys.executable, "-c", "pass"], args.repeat)
+    cli = wall_time([sys.executable, "-m", "adotools", "--help"], args.repeat)
+    heavy = loaded_heavy_modules()
+    results = {
+        "baseline_ms": round(baseline, 1),
+        "cli_help_ms": round(cli, 1),
+        "overhead_ms": round(cli - baseline, 1),
+        "budget_ms": args.budget,
+        "heavy_modules_at_import": heavy,
+    }
+
+    print(f"python -c pass          {baseline:8.1f} ms")
+    print(f"python -m adotools -h   {cli:8.1f} ms")
+    print(f"overhead                {cli - baseline:8.1f} ms (budget {args.budget:.0f} ms)")
+    if heavy:
+        print(f"heavy modules imported at startup: {', '.join(heavy)}")
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=4)
+
+    return 1 if heavy or cli - baseline > args.budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
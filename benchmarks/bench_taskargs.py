@@ -0,0 +1,86 @@
+"""Compare taskargs against the split-based parser it replaced.
+
+Usage:
+    python benchmarks/bench_taskargs.py --users 50000 --nodes 10 --repeat 5
+"""
+
+import os
+import sys
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskargs import classify_task_arguments
+
+
+def legacy_parse_task_arguments(task_arguments, entity_type):
+    entities = []
+    tasks = task_arguments.split(" create|")
+
+    for task in tasks:
+        if task.strip():
+            details = task.split("|")
+            if entity_type == "user":
+                if len(details) >= 4:
+                    entities.append({
+                        "username": details[0],
+                        "fullname": details[1],
+                        "password": details[2],
+                        "groups": details[3].split(",")
+                    })
+            elif entity_type == "group":
+                if len(details) >= 2:
+                    entities.append({
+                        "groupname": details[0],
+                        "description": details[1]
+                    })
+
+    return entities
+
+
+def build_task_arguments(users):
+    return " ".join(
+        f"create|user{i}|User Number {i}|P@ssw0rd{i}|Administrators,Developers,Group{i % 50}"
+        for i in range(users)
+    )
+
+
+def main(args):
+    task_arguments = build_task_arguments(args.users)
+    print(f"taskArguments: {args.users} users, {len(task_arguments)} characters")
+
+    def legacy_both():
+        return legacy_parse_task_arguments(task_arguments, "user"), legacy_parse_task_arguments(task_arguments, "group")
+
+    def classify_uncached():
+        classify_task_arguments.cache_clear()
+        return classify_task_arguments(task_arguments)
+
+    def classify_nodes():
+        # --nodes nodes sharing the same arguments, as process_entities sees them.
+        classify_task_arguments.cache_clear()
+        for _ in range(args.nodes):
+            classify_task_arguments(task_arguments)
+
+    def legacy_nodes():
+        for _ in range(args.nodes):
+            legacy_both()
+
+    results = {}
+    for name, func in (("legacy user+group", legacy_both), ("taskargs single pass", classify_uncached),
+                       (f"legacy x{args.nodes} nodes", legacy_nodes), (f"taskargs x{args.nodes} nodes", classify_nodes)):
+        best = min(timeit.Timer(func).repeat(repeat=args.repeat, number=1))
+        results[name] = best
+        print(f"{name:28} {best * 1000:10.2f} ms")
+
+    print(f"speedup single string        {results['legacy user+group'] / results['taskargs single pass']:10.2f}x")
+    print(f"speedup shared arguments     {results[f'legacy x{args.nodes} nodes'] / results[f'taskargs x{args.nodes} nodes']:10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark taskArguments parsing")
+    parser.add_argument("--users", type=int, default=50000, help="Number of user records")
+    parser.add_argument("--nodes", type=int, default=10, help="Nodes sharing the same taskArguments")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    main(parser.parse_args())
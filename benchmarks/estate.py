@@ -0,0 +1,108 @@
+"""Write a synthetic compute_mf.yml and state JSON file.
+
+Computes alternate between Windows (win-os-accounts/win-os-groups) and
+RHEL (os-users/os-groups) according to --linuxRatio. Users and groups are
+drawn from estate-wide pools, so names repeat across computes the way they
+do in a real manifest. With --profiles N only N distinct compute
+configurations exist, which is what node dedupe feeds on.
+
+Usage:
+    python benchmarks/estate.py --computes 2000 --hosts 4 --users 20 --groups 8 --roster 10 --out /tmp/estate
+"""
+
+import os
+import copy
+import json
+import random
+import argparse
+
+
+def windows_compute(name, rng, users, groups, roster, user_pool, group_pool):
+    accounts = [{
+        'account-name': user,
+        'account-desc': f'{user} service account',
+        'logon-type': rng.choice(('rdp', 'batch'))
+    } for user in rng.sample(user_pool, users)]
+    account_names = [account['account-name'] for account in accounts]
+    os_groups = [{
+        'group-name': group,
+        'group-desc': f'{group} group',
+        'user-list': rng.sample(account_names, min(roster, len(account_names))),
+        'user-list-action': 'remove' if rng.random() < 0.1 else 'add'
+    } for group in rng.sample(group_pool, groups)]
+    return {'name': name, 'os': 'W2K19', 'win-os-accounts': accounts, 'win-os-groups': os_groups}
+
+
+def rhel_compute(name, rng, users, groups, user_pool, group_pool):
+    os_groups = [{'group': group, 'gid': 3000 + group_pool.index(group)} for group in rng.sample(group_pool, groups)]
+    gids = [group['gid'] for group in os_groups]
+    os_users = [{
+        'user': user,
+        'uid': 4000 + user_pool.index(user),
+        'gid': gids[0] if gids else '',
+        'secondary-gid': gids[1:3],
+        'home': f'/home/{user}'
+    } for user in rng.sample(user_pool, users)]
+    return {'name': name, 'os': 'RHEL8', 'os-users': os_users, 'os-groups': os_groups}
+
+
+def generate_estate(computes, hosts, users, groups, roster, linux_ratio=0.2, profiles=0, seed=1):
+    """Return (compute_mf, state) documents."""
+    rng = random.Random(seed)
+    user_pool = [f'user{index:05d}' for index in range(max(users * 4, 1))]
+    group_pool = [f'group{index:04d}' for index in range(max(groups * 4, 1))]
+
+    compute_config = []
+    compute_configs = []
+    templates = []
+    for index in range(computes):
+        name = f'compute{index:05d}'
+        if profiles and index >= profiles:
+            # Copied, not shared, so the YAML has no anchors/aliases a real manifest would not have
+            compute = dict(copy.deepcopy(templates[index % profiles]), name=name)
+        else:
+            if rng.random() < linux_ratio:
+                compute = rhel_compute(name, rng, users, groups, user_pool, group_pool)
+            else:
+                compute = windows_compute(name, rng, users, groups, roster, user_pool, group_pool)
+            templates.append(compute)
+        compute_config.append(compute)
+        compute_configs.append({'name': name, 'hostnames': [f'{name}-h{host:02d}' for host in range(hosts)]})
+
+    return {'compute-config': compute_config}, {'compute_configs': compute_configs}
+
+
+def write_estate(directory, computes, hosts, users, groups, roster, linux_ratio=0.2, profiles=0, seed=1):
+    """Write compute_mf.yml and state.json into directory; return their paths."""
+    import yaml
+
+    compute_mf, state = generate_estate(computes, hosts, users, groups, roster, linux_ratio, profiles, seed)
+    os.makedirs(directory, exist_ok=True)
+    compute_path = os.path.join(directory, 'compute_mf.yml')
+    state_path = os.path.join(directory, 'state.json')
+    with open(compute_path, 'w') as compute_file:
+        yaml.dump(compute_mf, compute_file, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), sort_keys=False)
+    with open(state_path, 'w') as state_file:
+        json.dump(state, state_file)
+    return compute_path, state_path
+
+
+def add_arguments(parser):
+    parser.add_argument('--computes', type=int, default=500)
+    parser.add_argument('--hosts', type=int, default=2, help='Hosts per compute')
+    parser.add_argument('--users', type=int, default=10, help='Users per compute')
+    parser.add_argument('--groups', type=int, default=5, help='Groups per compute')
+    parser.add_argument('--roster', type=int, default=5, help='Members listed per Windows group')
+    parser.add_argument('--linuxRatio', type=float, default=0.2, help='Share of RHEL computes')
+    parser.add_argument('--profiles', type=int, default=0, help='Distinct compute configurations (0 = all distinct)')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic estate')
+    add_arguments(parser)
+    parser.add_argument('--out', default='.', help='Output directory')
+    args = parser.parse_args()
+    for path in write_estate(args.out, args.computes, args.hosts, args.users, args.groups, args.roster,
+                             args.linuxRatio, args.profiles, args.seed):
+        print(path)
@@ -0,0 +1,331 @@
+"""An in-process stand-in for the Azure DevOps REST endpoints the scripts call.
+
+Serves jobrequests, git/repositories, pipelines,
+distributedtask/environments, securefiles, graph/groups, identities,
+accesscontrolentries, securityroles and projects for any
+organization/project in the path, backed by a synthetic data set. Each request can be delayed (--latency,
+--jitter), answered with 429 + Retry-After (--throttle), and list
+responses are cut into --pageSize pages linked by x-ms-continuationtoken.
+
+Usage:
+    python benchmarks/mock_ado.py --port 8080 --latency 20 --throttle 0.05 --pageSize 100
+    AZDO_URL=http://127.0.0.1:8080 python Getciidandenv.py --org org --project proj --pat x
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTES = []
+
+
+def route(method, pattern):
+    """Register a handler for method and a regex matched against the path after /_apis/."""
+    def register(handler):
+        ROUTES.append((method, re.compile(pattern + '$'), handler))
+        return handler
+    return register
+
+
+class MockAdo:
+    """Synthetic ADO data plus the latency/throttling/paging behaviour."""
+
+    def __init__(self, repos=200, environments=50, jobs=500, ciids=50, pipelines=100, latency_ms=0.0, jitter_ms=0.0,
+                 throttle=0.0, retry_after=0.0, page_size=100, seed=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.throttled = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        ciid_pool = [f'{10000 + index * 7}' for index in range(max(ciids, 1))]
+        self.project_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        self.repos = [{
+            'id': self.new_id(),
+            'name': f'{ciid_pool[index % len(ciid_pool)]}-service-{index:04d}',
+            'defaultBranch': 'refs/heads/main'
+        } for index in range(repos)]
+        self.pipelines = [{
+            'id': index + 1,
+            'name': f'{ciid_pool[index % len(ciid_pool)]}-pipeline-{index:04d}',
+            'folder': '\\'
+        } for index in range(pipelines)]
+        self.environments = [{
+            'id': index + 1,
+            'name': f'{ciid_pool[index % len(ciid_pool)]}-{"production_v2" if index % 3 == 0 else "uat"}'
+        } for index in range(environments)]
+        self.jobs = [{
+            'requestId': index + 1,
+            'queueTime': f'2026-01-01T{index % 24:02d}:00:00Z',
+            'assignTime': f'2026-01-01T{index % 24:02d}:00:05Z',
+            'finishTime': f'2026-01-01T{index % 24:02d}:05:00Z',
+            'result': 'succeeded' if index % 10 else 'failed',
+            'agent': {'name': f'agent-{index % 16:02d}'},
+            'owner': {'name': f'pipeline-run-{index}'},
+            'definition': {'name': f'pipeline-{index % 40:02d}'}
+        } for index in range(jobs)]
+        self.groups = [{
+            'descriptor': f'vssgp.{self.new_id()}',
+            'displayName': f'ADO-{ciid}-{role}-{access}',
+            'originId': self.new_id()
+        } for ciid in ciid_pool for role in ('Engineer', 'PSS') for access in ('review', 'write')]
+        self.secure_files = {}
+        self.access_control_entries = []
+        self.role_assignments = []
+
+    def new_id(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128)))
+
+    def delay(self):
+        seconds = (self.latency_ms + self.rng.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def should_throttle(self):
+        with self.lock:
+            return self.throttle > 0 and self.rng.random() < self.throttle
+
+    def record(self, endpoint, throttled, sent, received):
+        with self.lock:
+            self.requests[endpoint] += 1
+            if throttled:
+                self.throttled[endpoint] += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def page(self, items, query):
+        """Return (page, continuation token or None) honouring $top, --pageSize and continuationToken."""
+        start = int(query.get('continuationToken', ['0'])[0] or 0)
+        size = self.page_size or len(items)
+        if '$top' in query:
+            size = min(size, int(query['$top'][0]))
+        end = start + size
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'throttled': dict(self.throttled),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.throttled.clear()
+            self.bytes_sent = self.bytes_received = 0
+
+
+@route('GET', r'distributedtask/pools/(?P<pool>\d+)/jobrequests')
+def job_requests(ado, query, body, pool):
+    return 200, ado.jobs
+
+
+@route('GET', r'git/repositories')
+def repositories(ado, query, body):
+    return 200, ado.repos
+
+
+@route('GET', r'pipelines')
+def pipelines(ado, query, body):
+    return 200, ado.pipelines
+
+
+@route('GET', r'distributedtask/environments')
+def environments(ado, query, body):
+    return 200, ado.environments
+
+
+@route('GET', r'distributedtask/securefiles')
+def list_secure_files(ado, query, body):
+    return 200, list(ado.secure_files.values())
+
+
+@route('POST', r'distributedtask/securefiles')
+def upload_secure_file(ado, query, body):
+    name = query.get('name', [''])[0]
+    if not name:
+        return 400, {'message': 'name is required'}
+    secure_file = {'id': ado.new_id(), 'name': name, 'size': len(body)}
+    with ado.lock:
+        if any(existing['name'] == name for existing in ado.secure_files.values()):
+            return 409, {'message': f'Secure file {name} already exists'}
+        ado.secure_files[secure_file['id']] = secure_file
+    return 200, secure_file
+
+
+@route('DELETE', r'distributedtask/securefiles/(?P<file_id>[^/]+)')
+def delete_secure_file(ado, query, body, file_id):
+    with ado.lock:
+        return (204, None) if ado.secure_files.pop(file_id, None) else (404, {'message': 'Not found'})
+
+
+@route('GET', r'graph/groups')
+def graph_groups(ado, query, body):
+    return 200, ado.groups
+
+
+@route('GET', r'identities')
+def identities(ado, query, body):
+    wanted = query.get('filterValue', [''])[0].lower()
+    return 200, [{
+        'id': group['originId'],
+        'descriptor': group['descriptor'],
+        'providerDisplayName': group['displayName']
+    } for group in ado.groups if wanted in group['displayName'].lower()]
+
+
+@route('POST', r'accesscontrolentries/(?P<namespace>[^/]+)')
+def access_control_entries(ado, query, body, namespace):
+    request = json.loads(body or b'{}')
+    entries = request.get('accessControlEntries', [])
+    with ado.lock:
+        ado.access_control_entries.extend((namespace, request.get('token'), entry) for entry in entries)
+    return 200, entries
+
+
+@route('PUT', r'securityroles/scopes/(?P<scope>[^/]+)/roleassignments/resources/(?P<resource>[^/]+)')
+def role_assignments(ado, query, body, scope, resource):
+    assignments = json.loads(body or b'[]')
+    with ado.lock:
+        ado.role_assignments.extend((scope, resource, assignment) for assignment in assignments)
+    return 200, assignments
+
+
+@route('GET', r'projects/(?P<project>[^/]+)')
+def project(ado, query, body, project):
+    return 200, {'id': ado.project_id, 'name': project, 'state': 'wellFormed'}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    ado = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self, method):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        ado = self.ado
+        ado.delay()
+
+        _, _, api_path = parts.path.partition('/_apis/')
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(api_path)
+            if route_method == method and match:
+                endpoint = handler.__name__
+                break
+        else:
+            ado.record('unknown', False, self.reply(404, {'message': f'No route for {method} {parts.path}'}), length)
+            return
+
+        if ado.should_throttle():
+            sent = self.reply(429, {'message': 'Request was blocked due to exceeding usage of resource'},
+                              {'Retry-After': f'{ado.retry_after:g}'})
+            ado.record(endpoint, True, sent, length)
+            return
+
+        status, payload = handler(ado, query, body, **match.groupdict())
+        headers = {}
+        if isinstance(payload, list) and method == 'GET':
+            payload, token = ado.page(payload, query)
+            if token:
+                headers['x-ms-continuationtoken'] = token
+            payload = {'count': len(payload), 'value': payload}
+        ado.record(endpoint, False, self.reply(status, payload, headers), length)
+
+    def reply(self, status, payload, headers=None):
+        data = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class MockAdoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ado, host='127.0.0.1', port=0):
+        handler = type('MockAdoHandler', (Handler,), {'ado': ado})
+        super().__init__((host, port), handler)
+        self.ado = ado
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def add_arguments(parser):
+    parser.add_argument('--repos', type=int, default=200)
+    parser.add_argument('--environments', type=int, default=50)
+    parser.add_argument('--pipelines', type=int, default=100)
+    parser.add_argument('--jobs', type=int, default=500, help='Agent pool job requests')
+    parser.add_argument('--ciids', type=int, default=50, help='CIIDs; each has four ADO-<ciid>-* groups')
+    parser.add_argument('--latency', type=float, default=0.0, help='Milliseconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra milliseconds')
+    parser.add_argument('--throttle', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--retryAfter', type=float, default=0.0, help='Retry-After seconds sent with 429')
+    parser.add_argument('--pageSize', type=int, default=100, help='Items per list page (0 = unpaged)')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def from_arguments(args):
+    return MockAdo(args.repos, args.environments, args.jobs, args.ciids, args.pipelines, args.latency, args.jitter,
+                   args.throttle, args.retryAfter, args.pageSize, args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a mock Azure DevOps REST API')
+    add_arguments(parser)
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    server = MockAdoServer(from_arguments(args), port=args.port)
+    print(f'Serving mock Azure DevOps on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.ado.stats(), indent=4))
@@ -0,0 +1,245 @@
+"""Extract CIIDs from spreadsheets and reconcile them with the ADO project.
+
+Input rows are streamed and never loaded whole. xlsx sheets are read
+with iterparse, and only the cells of the wanted column are decoded.
+CSV files are read through pandas in chunks. CIIDs are extracted with
+one vectorised str.extract per CHUNK_ROWS rows. Each chunk is reduced to
+its unique values before it is merged into the running set.
+The CIIDs are then joined with the repositories, pipelines and
+production_v2 environments of the project. Those come from the live
+project, or from exported listings such as test.json.txt.xlsx.
+
+Usage:
+    python ciid.py extracted_5_digit_numbers.xlsx "Unique I d.xlsx" --org ORG --project PROJECT --out ciids.xlsx
+    python ciid.py ciids.csv --repoFile test.json.txt.xlsx --out ciids.csv
+"""
+
+import re
+import sys
+import time
+import zipfile
+from xml.etree import ElementTree
+
+import pandas as pd
+
+CIID_PATTERN = r"(\d{5})"  # same rule as Getciidandenv.extract_ciid, without its name fallback
+CHUNK_ROWS = 50000
+PRODUCTION_ENVIRONMENT = "production_v2"
+COLUMN_HINTS = (re.compile(r"ciid|digits", re.I), re.compile(r"^name$", re.I))
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+RESULT_COLUMNS = ["ciid", "in_input", "repos", "pipelines", "production_v2_envs",
+                  "repo_names", "pipeline_names", "production_v2_env_names"]
+
+
+def pick_column(header, column=None):
+    """Index of column in header: the named one, else the first CIID/name-like one, else the first."""
+    header = ["" if name is None else str(name) for name in header]
+    if column is not None:
+        if column in header:
+            return header.index(column)
+        if str(column).isdigit():
+            return int(column)
+        raise ValueError(f"Column '{column}' not found; columns are {', '.join(header)}")
+    for hint in COLUMN_HINTS:
+        for index, name in enumerate(header):
+            if hint.search(name):
+                return index
+    return 0
+
+
+def xlsx_sheet_path(archive, sheet=None):
+    """Archive path of the named (default: first) worksheet."""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    sheets = workbook.find(f"{SHEET_NS}sheets")
+    chosen = next((item for item in sheets if sheet is None or item.get("name") == sheet), None)
+    if chosen is None:
+        raise ValueError(f"Worksheet '{sheet}' not found")
+    relations = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    target = next(item.get("Target") for item in relations if item.get("Id") == chosen.get(f"{RELATIONSHIP_NS}id"))
+    return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+
+def xlsx_shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as xml:
+        for _, element in ElementTree.iterparse(xml):
+            if element.tag == f"{SHEET_NS}si":
+                strings.append("".join(text.text or "" for text in element.iter(f"{SHEET_NS}t")))
+                element.clear()
+    return strings
+
+
+def column_number(reference):
+    """Zero-based column of a cell reference such as "AB12"."""
+    number = 0
+    for char in reference:
+        if char.isdigit():
+            break
+        number = number * 26 + ord(char) - 64
+    return number - 1
+
+
+def iter_xlsx_chunks(path, column=None, sheet=None, chunk_rows=CHUNK_ROWS):
+    # openpyxl's read-only mode still builds a cell object for every cell
+    # (about 15s for 300k rows); iterparse over the sheet XML only decodes
+    # the cells of the wanted column.
+    cell_tag, row_tag, value_tag, text_tag = (f"{SHEET_NS}{tag}" for tag in ("c", "row", "v", "t"))
+    with zipfile.ZipFile(path) as archive:
+        shared = xlsx_shared_strings(archive)
+        with archive.open(xlsx_sheet_path(archive, sheet)) as xml:
+            header = []
+            index = None
+            position = 0
+            value = None
+            chunk = []
+            for _, element in ElementTree.iterparse(xml):
+                tag = element.tag
+                if tag == cell_tag:
+                    reference = element.get("r")
+                    cell = column_number(reference) if reference else position
+                    position = cell + 1
+                    if index is None or cell == index:
+                        kind = element.get("t")
+                        if kind == "inlineStr":
+                            text = "".join(item.text or "" for item in element.iter(text_tag))
+                        else:
+                            text = element.findtext(value_tag)
+                            if kind == "s" and text is not None:
+                                text = shared[int(text)]
+                        if index is None:
+                            header.extend([None] * (cell - len(header)))
+                            header.append(text)
+                        else:
+                            value = text
+                elif tag == row_tag:
+                    if index is None:
+                        index = pick_column(header, column)
+                    else:
+                        chunk.append(value)
+                        if len(chunk) >= chunk_rows:
+                            yield chunk
+                            chunk = []
+                    position = 0
+                    value = None
+                    element.clear()
+            if chunk:
+                yield chunk
+
+
+def iter_csv_chunks(path, column=None, chunk_rows=CHUNK_ROWS):
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    index = pick_column(header, column)
+    for frame in pd.read_csv(path, usecols=[index], dtype=str, chunksize=chunk_rows, keep_default_na=False):
+        yield frame.iloc[:, 0]
+
+
+def iter_chunks(path, column=None, sheet=None, chunk_rows=CHUNK_ROWS):
+    """Yield the values of one column of an xlsx or CSV file, chunk_rows at a time."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_chunks(path, column, sheet, chunk_rows)
+    return iter_csv_chunks(path, column, chunk_rows)
+
+
+def extract_ciids(values):
+    """Series of the first 5-digit run in each value (NaN where there is none)."""
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    return series.astype(str).str.extract(CIID_PATTERN, expand=False)
+
+
+def read_ciids(paths, column=None, sheet=None, chunk_rows=CHUNK_ROWS):
+    """Return (rows read, rows without a CIID, set of CIIDs) over all paths."""
+    rows = missing = 0
+    ciids = set()
+    for path in paths:
+        for chunk in iter_chunks(path, column, sheet, chunk_rows):
+            extracted = extract_ciids(chunk)
+            rows += len(extracted)
+            missing += int(extracted.isna().sum())
+            ciids.update(extracted.dropna().unique())
+    return rows, missing, ciids
+
+
+def names_by_ciid(names):
+    """DataFrame indexed by CIID with the count and the sorted, comma separated names."""
+    names = pd.Series(list(names), dtype=object).dropna().astype(str)
+    frame = pd.DataFrame({"ciid": extract_ciids(names), "name": names}).dropna()
+    grouped = frame.sort_values("name").groupby("ciid")["name"]
+    return pd.DataFrame({"count": grouped.size(), "names": grouped.agg(", ".join)})
+
+
+def reconcile(ciids, repo_names, pipeline_names, environment_names):
+    """One row per CIID of the input or of the project, with its repos, pipelines and production_v2 environments."""
+    production = [name for name in environment_names if PRODUCTION_ENVIRONMENT in (name or "").lower()]
+    repos = names_by_ciid(repo_names)
+    pipelines = names_by_ciid(pipeline_names)
+    environments = names_by_ciid(production)
+
+    index = pd.Index(sorted(set(ciids) | set(repos.index) | set(pipelines.index) | set(environments.index)), name="ciid")
+    result = pd.DataFrame(index=index)
+    result["in_input"] = index.isin(list(ciids))
+    for column, frame in (("repos", repos), ("pipelines", pipelines), ("production_v2_envs", environments)):
+        result[column] = frame["count"].reindex(index, fill_value=0).astype(int)
+    for column, frame in (("repo_names", repos), ("pipeline_names", pipelines), ("production_v2_env_names", environments)):
+        result[column] = frame["names"].reindex(index, fill_value="")
+    return result.reset_index()[RESULT_COLUMNS]
+
+
+def listing_names(path, column="name", sheet=None):
+    """Names from an exported listing (xlsx or CSV), such as the repositories in test.json.txt.xlsx."""
+    names = []
+    for chunk in iter_chunks(path, column, sheet):
+        names.extend(value for value in chunk if value)
+    return names
+
+
+def fetch_project_names(org, project, pat):
+    """(repo names, pipeline names, environment names) of the live project."""
+    import Getciidandenv
+
+    repos = [repo.get("name") for repo in Getciidandenv.get_all_repos(org, project, pat)]
+    pipelines = [pipeline.get("name") for pipeline in Getciidandenv.get_all_pipelines(org, project, pat)]
+    environments = [env.get("name") for env in Getciidandenv.get_all_environments(org, project, pat)]
+    return repos, pipelines, environments
+
+
+def write_result(result, path):
+    if path.lower().endswith(".csv"):
+        result.to_csv(path, index=False)
+    else:
+        result.to_excel(path, index=False, engine="openpyxl")
+
+
+def main(args):
+    start = time.perf_counter()
+    rows, missing, ciids = read_ciids(args.inputs, args.column, args.sheet)
+    print(f"Read {rows} rows from {len(args.inputs)} file(s): {len(ciids)} unique CIIDs, {missing} rows without one "
+          f"({time.perf_counter() - start:.2f}s)")
+
+    if args.repoFile:
+        repos = listing_names(args.repoFile)
+        pipelines = listing_names(args.pipelineFile) if args.pipelineFile else []
+        environments = listing_names(args.environmentFile) if args.environmentFile else []
+    else:
+        repos, pipelines, environments = fetch_project_names(args.org, args.project, args.pat)
+    print(f"Project: {len(repos)} repositories, {len(pipelines)} pipelines, {len(environments)} environments")
+
+    result = reconcile(ciids, repos, pipelines, environments)
+    wanted = result[result["in_input"]]
+    print(f"Input CIIDs with repos: {int((wanted['repos'] > 0).sum())}, pipelines: {int((wanted['pipelines'] > 0).sum())}, "
+          f"{PRODUCTION_ENVIRONMENT} environments: {int((wanted['production_v2_envs'] > 0).sum())}, "
+          f"none: {int(((wanted['repos'] == 0) & (wanted['pipelines'] == 0) & (wanted['production_v2_envs'] == 0)).sum())}")
+    print(f"Project CIIDs missing from the input: {int((~result['in_input']).sum())}")
+
+    write_result(result, args.out)
+    print(f"Wrote {len(result)} rows to '{args.out}' ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    from adotools.cli import main as cli_main
+    sys.exit(cli_main(["ciid", *sys.argv[1:]]))
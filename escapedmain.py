@@ -4,9 +4,15 @@ import json
 import traceback
 from glob import glob
 from prettytable import PrettyTable
+from membership import MembershipDelta
+from summary import ChangeSummary, escape_variable
+from limits import Limits
+from instrument import timed, instrumented, file_size
+from pipelinelog import log
 
 class YamlLoader:
     @staticmethod
+    @timed('yaml.load', size=file_size)
     def load(file_path):
         try:
             with open(file_path, 'r') as file:
@@ -16,6 +22,7 @@ class YamlLoader:
 
 class JsonLoader:
     @staticmethod
+    @timed('json.load', size=file_size)
     def load(file_path):
         try:
             with open(file_path, 'r') as file:
@@ -33,35 +40,37 @@ class Parser:
         else:
             return 'unknown'
 
+    @timed('parse_compute')
     def parse_compute(self, computeFilePath):
-        print(f'Parsing file: {computeFilePath}')
+        log.info(f'Parsing file: {computeFilePath}')
         data = {}
         yaml_loader = YamlLoader()
         compute_mf = yaml_loader.load(computeFilePath)
 
         if compute_mf:
-            computes = compute_mf.get('compute-config',)
+            computes = compute_mf.get('compute-config', [])
             for compute in computes:
                 compute_name = compute['name'].lower()
                 os_type = self.parse_os_name(compute['os']).lower()
                 data[compute_name] = {
                     'os': os_type,
-                    'os_groups': compute.get('win-os-groups',),
-                    'os_users': compute.get('win-os-accounts',)
+                    'os_groups': compute.get('win-os-groups', []),
+                    'os_users': compute.get('win-os-accounts', [])
                 }
         return data
 
+    @timed('parse_state')
     def parse_state(self, stateFilePath):
-        print(f'Parsing file: {stateFilePath}')
+        log.info(f'Parsing file: {stateFilePath}')
         data = {}
         json_loader = JsonLoader()
         state_file = json_loader.load(stateFilePath)
 
         if state_file:
-            compute_configs = state_file.get('compute_configs',)
+            compute_configs = state_file.get('compute_configs', [])
             for compute in compute_configs:
                 compute_name = compute['name'].lower()
-                hostnames = compute.get('hostnames',)
+                hostnames = compute.get('hostnames', [])
                 data[compute_name] = hostnames
 
         return data
@@ -70,36 +79,38 @@ class Report:
     def __init__(self):
         self.data = {}
 
+    @timed('report')
     def print_data(self):
         t1 = PrettyTable(['Hosts'])
-        for host in self.data.get('hostnames',):
+        for host in self.data.get('hostnames', []):
             t1.add_row([host])
-        print(t1)
+        log.write(str(t1))
 
-        print('Added Users:')
+        log.write('Added Users:')
         t2 = PrettyTable(['User', 'Group'])
-        for user in self.data.get('added_users',):
-            groups = ', '.join(self.data.get('added_groups', {}).get(user,))
+        for user in self.data.get('added_users', []):
+            groups = ', '.join(self.data.get('added_groups', {}).get(user, []))
             t2.add_row([user, groups])
-        print(t2)
+        log.write(str(t2))
 
-        print('Removed Users:')
+        log.write('Removed Users:')
         t3 = PrettyTable(['User', 'Group'])
-        for user in self.data.get('removed_users',):
-            groups = ', '.join(self.data.get('removed_users', {}).get(user,))
+        for user in self.data.get('removed_users', []):
+            groups = ', '.join(self.data.get('removed_users', {}).get(user, []))
             t3.add_row([user, groups])
-        print(t3)
+        log.write(str(t3))
 
     def set_data(self, value):
         self.data = value
 
-def generate_json(compute_data, state_data, target_hosts):
+@timed('generate_json')
+def generate_json(compute_data, state_data, limits, summary):
     user_json = {
         "deploy_artifact": "https://artifactory.global.standardchartered.com/artifactory/generic-sc-release_lo",
         "script": "win_user_action.ps1",
         "build_id": 856825,
         "build_local_path": "create-group-win-ps1",
-        "listOfNodes":
+        "listOfNodes": []
     }
 
     group_json = {
@@ -107,53 +118,57 @@ def generate_json(compute_data, state_data, target_hosts):
         "script": "win_group_action.ps1",
         "build_id": 856825,
         "build_local_path": "create-group-win-ps1",
-        "listOfNodes":
+        "listOfNodes": []
     }
 
     for compute_name, hostnames in state_data.items():
-        if compute_name not in compute_data:
+        if compute_name not in compute_data or not limits.computes(compute_name):
             continue
 
-        if target_hosts and not any(host in target_hosts for host in hostnames):
-            continue  # Skip hosts not in the target list
+        hostnames = limits.hosts.filter(hostnames)
+        if not hostnames:
+            continue  # No hosts of this compute are in the limit
 
         os_type = compute_data[compute_name].get("os", "")
-        if os_type!= "windows":
-            print(f'##vso[task.logissue type=warning]{compute_name} is not a Windows machine. Skipping...')
+        summary.compute(compute_name, os_type, hostnames)
+        if os_type != "windows":
+            log.warning(f'{compute_name} is not a Windows machine. Skipping...', compute=compute_name)
+            summary.skipped(compute_name, "not a Windows machine")
             continue
 
-        print(f'Processing Host: {compute_name} | Hostnames: {hostnames}')
+        log.info(f'Processing Host: {compute_name} | Hostnames: {hostnames}', compute=compute_name)
 
-        added_users =
-        added_groups = {}
+        delta = MembershipDelta()
 
-        user_args =
-        group_args =
+        user_args = []
+        group_args = []
 
         if compute_data[compute_name]["os_users"]:
             for user in compute_data[compute_name]["os_users"]:
                 username = user['account-name']
+                if not limits.users(username):
+                    continue
                 description = user['account-desc']
                 rdp = 'true' if user['logon-type'] == 'rdp' else 'false'
 
-                if username not in added_users:
-                    added_users.append(username)
+                delta.add_user(username)
+                summary.user_created(compute_name, username)
 
                 user_args.append(f"create {username}|{description}")
 
         if compute_data[compute_name]["os_groups"]:
             for group in compute_data[compute_name]["os_groups"]:
                 group_name = group['group-name']
+                if not limits.groups(group_name):
+                    continue
                 description = group['group-desc']
-                user_list = group['user-list']
+                user_list = limits.users.filter(group['user-list'])
                 user_list_action = group['user-list-action']
 
+                delta.apply(group_name, user_list, user_list_action)
+                summary.group_created(compute_name, group_name)
                 for user in user_list:
-                    if user_list_action == 'add':
-                        if group_name not in added_groups.setdefault(user,):
-                            added_groups[user].append(group_name)
-                    elif user_list_action == 'remove':
-                        added_groups.setdefault(user,).remove(group_name)
+                    summary.membership(compute_name, group_name, user, user_list_action)
 
                 group_args.append(f"create {group_name}|{description}")
 
@@ -173,66 +188,61 @@ def generate_json(compute_data, state_data, target_hosts):
     with open("windows_groups.json", "w") as group_file:
         json.dump(group_json, group_file, indent=4)
 
-    print("JSON files created successfully!")
+    log.info("JSON files created successfully!")
 
-try:
-    parser = Parser()
+@instrumented
+def main():
+    try:
+        parser = Parser()
 
-    computeFilePath = os.getenv("computeFilePath")
-    stateFilePath = os.getenv("stateFilePath")
-    targetHostnames = os.getenv("targetHostnames")  # New variable for filtering
+        computeFilePath = os.getenv("computeFilePath")
+        stateFilePath = os.getenv("stateFilePath")
+        limits = Limits.from_env()  # limit_* parameters; targetHostnames still works for hosts
 
-    compute_data = parser.parse_compute(computeFilePath)
-    state_data = parser.parse_state(glob(stateFilePath))
+        compute_data = parser.parse_compute(computeFilePath)
+        state_data = parser.parse_state(glob(stateFilePath)[0])
 
-    target_hosts_list = targetHostnames.split(",") if targetHostnames else
+        summary = ChangeSummary()
+        generate_json(compute_data, state_data, limits, summary)
 
-    generate_json(compute_data, state_data, target_hosts_list)
-
-    report = Report()
-    report.set_data({
-        'hostnames': state_data,
-        'added_users':,
-        'added_groups': {},
-        'removed_users': {}
-    })
-    report.print_data()
-
-    added_users_array =
-    added_groups_array =
-    removed_users_array =
-    existing_groups =
-    modified_groups =
-
-    for compute_name, hostnames in state_data.items():
-        if compute_name in compute_data and compute_data[compute_name]["os_users"]:
-            for user in compute_data[compute_name]["os_users"]:
-                added_users_array.append(user['account-name'])
-        if compute_name in compute_data and compute_data[compute_name]["os_groups"]:
-            for group in compute_data[compute_name]["os_groups"]:
-                if group['group-name'] not in existing_groups:
-                    existing_groups.append(group['group-name'])
-                for user in group['user-list']:
-                    if group['user-list-action'] == 'add':
-                        if {'user': user, 'group': group['group-name']} not in added_groups_array:
-                            added_groups_array.append({'user': user, 'group': group['group-name']})
-                            modified_groups.append(group['group-name'])  # Add the group to modified_groups
-                    elif group['user-list-action'] == 'remove':
-                        removed_users_array.append({'user': user, 'group': group['group-name']})
-                        modified_groups.append(group['group-name'])  # Add the group to modified_groups
-
-    # Convert data to JSON and escape it
-    escaped_add_users_data = json.dumps(added_users_array).replace('"', '\\"')
-    escaped_add_groups_data = json.dumps(added_groups_array).replace('"', '\\"')
-    escaped_existing_groups_data = json.dumps(existing_groups).replace('"', '\\"')
-    escaped_modified_groups = json.dumps(modified_groups).replace('"', '\\"')
-
-    # Now you can use these escaped JSON strings in your Azure DevOps task
-    print(f'##vso[task.setvariable variable=AddedUsers;]{escaped_add_users_data}')
-    print(f'##vso[task.setvariable variable=AddedGroups;]{escaped_add_groups_data}')
-    print(f'##vso[task.setvariable variable=ExistingGroups;]{escaped_existing_groups_data}')
-    print(f'##vso[task.setvariable variable=ModifiedGroups;]{escaped_modified_groups}')
-
-except Exception as e:
-    print(f'##vso[task.logissue type=error] {traceback.format_exc()}')
-    print(f'##vso[task.complete result=SucceededWithIssues;] Task completed with warnings')
+        report = Report()
+        report.set_data({
+            'hostnames': state_data,
+            'added_users': [],
+            'added_groups': {},
+            'removed_users': {}
+        })
+        report.print_data()
+
+        # Everything below comes from the counters filled in by generate_json
+        summary_path = os.getenv("summaryPath", "change_summary.json")
+        summary.write(summary_path)
+        if os.getenv("publishSummary", "false").lower() == "true":
+            log.flush()
+            summary.publish(path=summary_path)
+
+        added_users_array = [user for user, counts in summary.users.items() if counts['created']]
+        added_groups_array = [{'user': user, 'group': group_name} for user, group_name in summary.memberships('add')]
+        existing_groups = list(summary.groups)
+        modified_groups = [group_name for group_name, counts in summary.groups.items() if counts['added'] or counts['removed']]
+
+        # Convert data to JSON and escape it
+        escaped_add_users_data = escape_variable(json.dumps(added_users_array))
+        escaped_add_groups_data = escape_variable(json.dumps(added_groups_array))
+        escaped_existing_groups_data = escape_variable(json.dumps(existing_groups))
+        escaped_modified_groups = escape_variable(json.dumps(modified_groups))
+
+        # Now you can use these escaped JSON strings in your Azure DevOps task
+        log.write(f'##vso[task.setvariable variable=AddedUsers;]{escaped_add_users_data}')
+        log.write(f'##vso[task.setvariable variable=AddedGroups;]{escaped_add_groups_data}')
+        log.write(f'##vso[task.setvariable variable=ExistingGroups;]{escaped_existing_groups_data}')
+        log.write(f'##vso[task.setvariable variable=ModifiedGroups;]{escaped_modified_groups}')
+
+    except Exception as e:
+        log.error(f' {traceback.format_exc()}')
+        log.write(f'##vso[task.complete result=SucceededWithIssues;] Task completed with warnings')
+    finally:
+        log.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Call counts, latencies and byte counts for the hot paths of the scripts.
+
+Functions wrapped with @timed (loaders, parsers, generate_json, remote
+commands, ADO requests) record one sample per call into a process-wide
+registry. Entry points wrapped with @instrumented print the collected
+timings when they finish: a text table, plus one ##vso[task.logdetail]
+timeline record per name when running on an ADO agent. Samples taken in
+ProcessPool workers stay in the worker.
+
+    @timed('yaml.load', size=file_size)
+    def load(file_path): ...
+
+Environment:
+    instrumentation  false turns recording and the table off
+    profileCapture   cprofile or pyinstrument profiles the entry point
+    profilePath      base name of the profile output (default: profile)
+    timingPath       also write the timings here as JSON
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import inspect
+import threading
+import functools
+import contextlib
+from datetime import datetime, timezone
+
+MAX_SAMPLES = 10000
+PERCENTILES = (50, 95, 99)
+
+
+def enabled():
+    return os.getenv("instrumentation", "true").lower() != "false"
+
+
+class Stat:
+    """Samples of one name; past MAX_SAMPLES a uniform reservoir is kept."""
+
+    __slots__ = ("count", "total", "max", "bytes", "samples", "started", "finished")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.samples = []
+        self.started = None
+        self.finished = None
+
+    def add(self, seconds, nbytes, started):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < MAX_SAMPLES:
+                self.samples[slot] = seconds
+        self.started = started if self.started is None else min(self.started, started)
+        self.finished = max(self.finished or 0.0, started + seconds)
+
+    def percentile(self, ordered, percent):
+        # Nearest rank
+        return ordered[max(0, -(-len(ordered) * percent // 100) - 1)] if ordered else 0.0
+
+    def to_dict(self):
+        ordered = sorted(self.samples)
+        data = {"count": self.count, "total_s": round(self.total, 6),
+                "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0}
+        for percent in PERCENTILES:
+            data[f"p{percent}_ms"] = round(self.percentile(ordered, percent) * 1000, 3)
+        data["max_ms"] = round(self.max * 1000, 3)
+        data["bytes"] = self.bytes
+        return data
+
+
+class Timings:
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, nbytes=0, started=None):
+        started = time.time() - seconds if started is None else started
+        with self.lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = Stat()
+            stat.add(seconds, nbytes, started)
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+
+    def to_dict(self):
+        with self.lock:
+            return {name: stat.to_dict() for name, stat in self.stats.items()}
+
+    def table(self):
+        columns = ["count", "total_s", "mean_ms"] + [f"p{percent}_ms" for percent in PERCENTILES] + ["max_ms", "bytes"]
+        data = self.to_dict()
+        width = max([len(name) for name in data] + [4])
+        lines = [f"{'Name':{width}} " + " ".join(f"{column:>10}" for column in columns)]
+        for name, stat in sorted(data.items(), key=lambda item: -item[1]["total_s"]):
+            lines.append(f"{name:{width}} " + " ".join(
+                f"{stat[column]:10d}" if isinstance(stat[column], int) else f"{stat[column]:10.3f}" for column in columns))
+        return "\n".join(lines)
+
+    def timeline(self):
+        """One ##vso[task.logdetail] record per name, spanning its first start to last finish."""
+        lines = []
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda item: item[1].started)
+        for order, (name, stat) in enumerate(stats, 1):
+            record_id = uuid.uuid5(uuid.NAMESPACE_URL, f"timing/{os.getpid()}/{name}")
+            lines.append(
+                f"##vso[task.logdetail id={record_id};name={name};type=timing;order={order};"
+                f"starttime={iso_time(stat.started)};finishtime={iso_time(stat.finished)};"
+                f"state=Completed;result=Succeeded]{stat.count} calls, {stat.total:.3f}s, {stat.bytes} bytes")
+        return lines
+
+
+def iso_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+TIMINGS = Timings()
+
+
+def record(name, seconds, nbytes=0, started=None):
+    if enabled():
+        TIMINGS.record(name, seconds, nbytes, started)
+
+
+# size= callables get (result, args, kwargs) of the wrapped call
+def file_size(result, args, kwargs):
+    """Size of the file named by the first argument."""
+    try:
+        return os.path.getsize(args[0])
+    except (OSError, TypeError, IndexError):
+        return 0
+
+
+def text_size(result, args, kwargs):
+    return len(result or "")
+
+
+def timed(name, size=None):
+    """Record each call of the wrapped function (or coroutine function) under name."""
+    def decorate(function):
+        def finish(start, wall, result, args, kwargs):
+            seconds = time.perf_counter() - start
+            nbytes = size(result, args, kwargs) if size is not None else 0
+            TIMINGS.record(name, seconds, nbytes, wall)
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                if not enabled():
+                    return await function(*args, **kwargs)
+                wall, start, result = time.time(), time.perf_counter(), None
+                try:
+                    result = await function(*args, **kwargs)
+                    return result
+                finally:
+                    finish(start, wall, result, args, kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not enabled():
+                    return function(*args, **kwargs)
+                wall, start, result = time.time(), time.perf_counter(), None
+                try:
+                    result = function(*args, **kwargs)
+                    return result
+                finally:
+                    finish(start, wall, result, args, kwargs)
+        return wrapper
+    return decorate
+
+
+_active = threading.local()
+
+
+@contextlib.contextmanager
+def profiling(capture=None, path=None):
+    """Profile the block with $profileCapture (cprofile or pyinstrument); nested blocks are no-ops."""
+    capture = (capture if capture is not None else os.getenv("profileCapture", "")).lower()
+    path = path or os.getenv("profilePath", "profile")
+    if not capture or getattr(_active, "profiling", False):
+        yield
+        return
+
+    _active.profiling = True
+    try:
+        if capture == "cprofile":
+            import pstats
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(f"{path}.prof")
+                print(f"Profile written to {path}.prof")
+                pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(25)
+        elif capture == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("##vso[task.logissue type=warning]profileCapture=pyinstrument but pyinstrument is not installed")
+                yield
+                return
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(f"{path}.html", "w") as html_file:
+                    html_file.write(profiler.output_html())
+                print(f"Profile written to {path}.html")
+                print(profiler.output_text())
+        else:
+            print(f"##vso[task.logissue type=warning]Unknown profileCapture '{capture}'; use cprofile or pyinstrument")
+            yield
+    finally:
+        _active.profiling = False
+
+
+def emit(stream=None, vso=None, path=None):
+    """Print the timings table (and timeline records on an ADO agent), then clear them."""
+    if not enabled() or not TIMINGS.stats:
+        return
+    stream = stream or sys.stdout
+    vso = os.getenv("TF_BUILD") is not None if vso is None else vso
+    path = path or os.getenv("timingPath")
+
+    print("##[group]Timings" if vso else "Timings:", file=stream)
+    print(TIMINGS.table(), file=stream)
+    if vso:
+        print("##[endgroup]", file=stream)
+        for line in TIMINGS.timeline():
+            print(line, file=stream)
+    if path:
+        with open(path, "w") as timing_file:
+            json.dump(TIMINGS.to_dict(), timing_file, indent=4)
+    TIMINGS.clear()
+
+
+def instrumented(function):
+    """Run an entry point under profiling() and emit() its timings when the outermost one returns."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        outermost = not getattr(_active, "entry", False)
+        _active.entry = True
+        try:
+            with profiling():
+                return function(*args, **kwargs)
+        finally:
+            if outermost:
+                _active.entry = False
+                emit()
+    return wrapper
@@ -0,0 +1,77 @@
+"""Include filters for the limit_* pipeline parameters.
+
+Each parameter is compiled once into a Limit. '*' or empty keeps
+everything, NA keeps nothing, and anything else is a comma separated list
+of names and glob patterns (app*, sg?-web). Names become a set lookup and
+patterns are joined into one precompiled regex, so checking an item never
+re-parses the parameter.
+"""
+
+import os
+import re
+import fnmatch
+
+GLOB_CHARS = frozenset('*?[')
+
+
+class Limit:
+    __slots__ = ('source', 'match_all', 'skip', 'names', 'pattern', 'casefold')
+
+    def __init__(self, value=None, casefold=False):
+        value = (value or '').strip()
+        self.source = value
+        self.casefold = casefold
+        self.match_all = value in ('', '*')
+        self.skip = value.lower() == 'na'
+        self.names = set()
+        patterns = []
+        if not (self.match_all or self.skip):
+            for item in value.split(','):
+                item = item.strip()
+                if casefold:
+                    item = item.lower()
+                if not item:
+                    continue
+                if GLOB_CHARS.intersection(item):
+                    patterns.append(fnmatch.translate(item))
+                else:
+                    self.names.add(item)
+        self.pattern = re.compile('|'.join(patterns)).match if patterns else None
+
+    def __call__(self, name):
+        if self.match_all:
+            return True
+        if self.skip:
+            return False
+        if self.casefold:
+            name = name.lower()
+        return name in self.names or (self.pattern is not None and self.pattern(name) is not None)
+
+    def filter(self, names):
+        if self.match_all:
+            return list(names)
+        return [name for name in names if self(name)]
+
+    def __repr__(self):
+        return f"Limit({self.source!r})"
+
+
+class Limits:
+    """The four limit parameters; compute and host names match case-insensitively."""
+
+    __slots__ = ('users', 'groups', 'computes', 'hosts')
+
+    def __init__(self, users=None, groups=None, computes=None, hosts=None):
+        self.users = Limit(users)
+        self.groups = Limit(groups)
+        self.computes = Limit(computes, casefold=True)
+        self.hosts = Limit(hosts, casefold=True)
+
+    @classmethod
+    def from_env(cls, environ=None):
+        # targetHostnames is the older name for limit_hostname
+        environ = os.environ if environ is None else environ
+        return cls(environ.get('limit_user_lists'),
+                   environ.get('limit_group_lists'),
+                   environ.get('limit_compute_config'),
+                   environ.get('limit_hostname') or environ.get('targetHostnames'))
@@ -3,6 +3,7 @@ import json
 import yaml
 import sys
 from prettytable import PrettyTable
+from taskargs import classify_task_arguments
 
 # Function to load YAML and JSON files from environment variables
 def load_configuration():
@@ -26,31 +27,6 @@ def load_configuration():
         print(f"Error: {e}")
         sys.exit(1)
 
-# Function to parse task arguments and extract user/group details
-def parse_task_arguments(task_arguments, entity_type):
-    entities = []
-    tasks = task_arguments.split(" create|")
-
-    for task in tasks:
-        if task.strip():
-            details = task.split("|")
-            if entity_type == "user":
-                if len(details) >= 4:
-                    entities.append({
-                        "username": details[0],
-                        "fullname": details[1],
-                        "password": details[2],
-                        "groups": details[3].split(",")
-                    })
-            elif entity_type == "group":
-                if len(details) >= 2:
-                    entities.append({
-                        "groupname": details[0],
-                        "description": details[1]
-                    })
-
-    return entities
-
 # Function to process compute machines & their states
 def process_machines():
     yaml_data, _ = load_configuration()  # We only need the YAML data here
@@ -81,9 +57,9 @@ def process_entities():
     groups = []
 
     for node in list_of_nodes:
-        task_arguments = node.get("taskArguments", "")
-        users.extend(parse_task_arguments(task_arguments, "user"))
-        groups.extend(parse_task_arguments(task_arguments, "group"))
+        node_users, node_groups = classify_task_arguments(node.get("taskArguments", ""))
+        users.extend(node_users)
+        groups.extend(node_groups)
 
     # Save extracted users and groups data into JSON files
     save_json("users", users)
@@ -100,7 +76,7 @@ def process_entities():
 def save_json(entity_type, data):
     output_file = f"C:\\Scripts\\{entity_type}s.json"
     with open(output_file, "w") as out_file:
-        json.dump({f"{entity_type}s": data}, out_file, indent=4)
+        json.dump({f"{entity_type}s": [entity.to_dict() for entity in data]}, out_file, indent=4)
 
 # Function to generate a report of added users/groups
 def generate_report(entity_type, entities):
@@ -108,7 +84,7 @@ def generate_report(entity_type, entities):
     
     for entity in entities:
         action = "Added"
-        table.add_row([entity.get("username", entity.get("groupname")), action])
+        table.add_row([entity.name, action])
 
     print(f"\nReport of Processed {entity_type.capitalize()}s:")
     print(table)
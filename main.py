@@ -1,30 +1,7 @@
 import json
 import sys
 import argparse
-
-def parse_task_arguments(task_arguments, entity_type):
-    entities = []
-    tasks = task_arguments.split(" create|")
-
-    for task in tasks:
-        if task.strip():
-            details = task.split("|")
-            if entity_type == "user":
-                if len(details) >= 4:
-                    entities.append({
-                        "username": details[0],
-                        "fullname": details[1],
-                        "password": details[2],
-                        "groups": details[3].split(",")
-                    })
-            elif entity_type == "group":
-                if len(details) >= 2:
-                    entities.append({
-                        "groupname": details[0],
-                        "description": details[1]
-                    })
-
-    return entities
+from taskargs import parse_task_arguments
 
 def process_json(json_file, entity_type):
     try:
@@ -39,7 +16,7 @@ def process_json(json_file, entity_type):
 
             output_file = f"C:\\Scripts\\{entity_type}s.json"
             with open(output_file, "w") as out_file:
-                json.dump({f"{entity_type}s": entities}, out_file, indent=4)
+                json.dump({f"{entity_type}s": [entity.to_dict() for entity in entities]}, out_file, indent=4)
 
         print(f"Processed {entity_type}s successfully.")
         sys.exit(0)
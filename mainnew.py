@@ -2,8 +2,17 @@ import os
 import json
 import yaml
 import sys
-import subprocess
-from prettytable import PrettyTable
+import socket
+from taskargs import classify_task_arguments
+from statestore import StateStore, config_hash
+from stages import puppet_stage, run_stages
+from puppetgen import write_manifest
+from reports import Section, open_report
+
+MACHINES = Section("machine", "Compute Machines", [("name", "Machine Name"), ("state", "State")])
+STAGES = Section("stage", "Pipeline Stage Timings", [("stage", "Stage"), ("depends_on", "Depends On"), ("status", "Status"), ("seconds", "Seconds")])
+USERS = Section("user", "Report of Processed Users", [("name", "Username/Group"), ("action", "Action")])
+GROUPS = Section("group", "Report of Processed Groups", [("name", "Username/Group"), ("action", "Action")])
 
 # Function to load YAML and JSON files from environment variables
 def load_configuration():
@@ -27,31 +36,6 @@ def load_configuration():
         print(f"Error: {e}")
         sys.exit(1)
 
-# Function to parse task arguments and extract user/group details
-def parse_task_arguments(task_arguments, entity_type):
-    entities = []
-    tasks = task_arguments.split(" create|")
-
-    for task in tasks:
-        if task.strip():
-            details = task.split("|")
-            if entity_type == "user":
-                if len(details) >= 4:
-                    entities.append({
-                        "username": details[0],
-                        "fullname": details[1],
-                        "password": details[2],
-                        "groups": details[3].split(",")
-                    })
-            elif entity_type == "group":
-                if len(details) >= 2:
-                    entities.append({
-                        "groupname": details[0],
-                        "description": details[1]
-                    })
-
-    return entities
-
 # Function to process compute machines & their states
 def process_machines():
     yaml_data, _ = load_configuration()  # We only need the YAML data here
@@ -62,14 +46,16 @@ def process_machines():
         return []
 
     print("Processing compute machines and their states:")
-    table = PrettyTable(["Machine Name", "State"])
+    report = open_report("machines", [MACHINES])
+    report.begin()
 
     for machine in machines:
         name = machine.get("name", "Unknown")
         state = machine.get("state", "Unknown")
-        table.add_row([name, state])
+        report.record(MACHINES, (name, state))
 
-    print(table)
+    report.end()
+    report.close()
     return machines
 
 # Function to process users and groups
@@ -80,11 +66,14 @@ def process_entities():
     
     users = []
     groups = []
+    manifest_nodes = []
 
     for node in list_of_nodes:
-        task_arguments = node.get("taskArguments", "")
-        users.extend(parse_task_arguments(task_arguments, "user"))
-        groups.extend(parse_task_arguments(task_arguments, "group"))
+        node_users, node_groups = classify_task_arguments(node.get("taskArguments", ""))
+        users.extend(node_users)
+        groups.extend(node_groups)
+        target_nodes = [host.strip() for host in node.get("targetNodes", "").split(",") if host.strip()]
+        manifest_nodes.append((target_nodes, node_users, node_groups))
 
     # Save extracted users and groups data into JSON files
     save_json("users", users)
@@ -95,9 +84,27 @@ def process_entities():
     generate_report("user", users)
     generate_report("group", groups)
 
+    # Skip Puppet when this host already has the same users and groups applied
+    state_db = os.getenv("stateDb")
+    host = socket.gethostname()
+    # Passwords stay out of the hash, which is stored in the state database
+    desired_hash = config_hash({
+        "users": [{key: value for key, value in user.to_dict().items() if key != "password"} for user in users],
+        "groups": [group.to_dict() for group in groups]
+    })
+    if state_db:
+        with StateStore(state_db) as store:
+            if store.is_current("puppet", host, desired_hash):
+                print(f"Desired state unchanged on {host}. Skipping Puppet.")
+                sys.exit(0)
+
     # Run Puppet for both users and groups
-    run_puppet("user")
-    run_puppet("group")
+    run_puppet(manifest_nodes)
+
+    if state_db:
+        memberships = [(user.username, group_name) for user in users for group_name in user.groups if group_name]
+        with StateStore(state_db) as store:
+            store.record("puppet", [host], desired_hash, [user.username for user in users], memberships, "run_puppet")
 
     sys.exit(0)
 
@@ -105,31 +112,61 @@ def process_entities():
 def save_json(entity_type, data):
     output_file = f"C:\\Scripts\\{entity_type}s.json"
     with open(output_file, "w") as out_file:
-        json.dump({f"{entity_type}s": data}, out_file, indent=4)
+        json.dump({f"{entity_type}s": [entity.to_dict() for entity in data]}, out_file, indent=4)
+
+# Function to execute Puppet for users and groups. By default the manifest is
+# generated from the parsed records, with Group -> User ordering expressed as
+# require edges; staticPuppetManifests=true applies the JSON-reading
+# group_config.pp then user_config.pp instead. Extra manifests (comma
+# separated in extraPuppetManifests) run alongside.
+def run_puppet(manifest_nodes):
+    if os.getenv("staticPuppetManifests", "false").lower() == "true":
+        stages = [
+            puppet_stage("group", "C:\\Scripts\\group_config.pp"),
+            puppet_stage("user", "C:\\Scripts\\user_config.pp", depends_on=["group"])
+        ]
+    else:
+        manifest = "C:\\Scripts\\users_groups.pp"
+        write_manifest(manifest, manifest_nodes)
+        stages = [puppet_stage("users_groups", manifest)]
+    extra_manifests = os.getenv("extraPuppetManifests", "")
+    for manifest in filter(None, (item.strip() for item in extra_manifests.split(","))):
+        stages.append(puppet_stage(os.path.splitext(os.path.basename(manifest))[0], manifest))
+
+    run_stages(stages)
+    generate_stage_report(stages)
+
+    failed = [stage for stage in stages if stage.status != "ok"]
+    if failed:
+        for stage in failed:
+            print(f"Error executing Puppet stage '{stage.name}': {stage.status} {stage.error or f'(exit {stage.returncode})'}")
+        sys.exit(1)
 
-# Function to execute Puppet manifest for user/group creation
-def run_puppet(entity_type):
-    try:
-        puppet_manifest = f"C:\\Scripts\\{entity_type}_config.pp"
-        command = ["puppet", "apply", puppet_manifest]
-        subprocess.run(command, check=True)
+    print("Puppet applied successfully for users and groups.")
 
-        print(f"Puppet applied successfully for {entity_type}s.")
-    
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing Puppet: {e}")
-        sys.exit(1)
+# Function to report per-stage wall-clock time
+def generate_stage_report(stages):
+    report = open_report("stages", [STAGES])
+    report.begin()
+
+    for stage in stages:
+        report.record(STAGES, (stage.name, list(stage.depends_on), stage.status, f"{stage.duration:.1f}"))
+
+    report.end()
+    report.close()
 
 # Function to generate a report of added, modified, and removed users/groups
 def generate_report(entity_type, entities):
-    table = PrettyTable(["Username/Group", "Action"])
-    
+    section = USERS if entity_type == "user" else GROUPS
+    report = open_report(f"{entity_type}s", [section])
+    report.begin()
+
     for entity in entities:
         action = "Added"
-        table.add_row([entity.get("username", entity.get("groupname")), action])
+        report.record(section, (entity.name, action))
 
-    print(f"\nReport of Processed {entity_type.capitalize()}s:")
-    print(table)
+    report.end()
+    report.close()
 
 # Main Execution
 if __name__ == "__main__":
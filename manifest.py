@@ -0,0 +1,228 @@
+"""Typed compute manifest: compute_mf.yml validated once into __slots__ records.
+
+parse_computes turns the compute-config list into {name: Compute}. Every
+entry is checked up front. Problems such as missing keys, wrong types or
+unknown user-list actions are collected and raised together as one
+ManifestError, so they never surface as a KeyError halfway through
+generate_json. Names are interned, so the same user or group on
+thousands of computes is one string.
+
+    computes = parse_computes(compute_mf.get('compute-config', []), classify_os, limits)
+    for account in computes['compute-a'].accounts:
+        print(account.name, account.rdp)
+"""
+
+import sys
+
+USER_LIST_ACTIONS = ('add', 'remove')
+
+
+class ManifestError(ValueError):
+    def __init__(self, source, errors):
+        self.errors = errors
+        super().__init__(f"{source}: {len(errors)} manifest error(s)\n" + "\n".join(f"  {error}" for error in errors))
+
+
+def intern_name(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Account:
+    """A win-os-accounts entry."""
+
+    __slots__ = ('name', 'description', 'logon_type')
+
+    def __init__(self, name, description, logon_type):
+        self.name = name
+        self.description = description
+        self.logon_type = logon_type
+
+    @property
+    def rdp(self):
+        return self.logon_type == 'rdp'
+
+
+class Group:
+    """A win-os-groups entry; members are added or removed according to action."""
+
+    __slots__ = ('name', 'description', 'members', 'action')
+
+    def __init__(self, name, description, members, action):
+        self.name = name
+        self.description = description
+        self.members = members
+        self.action = action
+
+
+class RhelUser:
+    """An os-users entry."""
+
+    __slots__ = ('name', 'uid', 'gid', 'secondary_gids', 'home')
+
+    def __init__(self, name, uid=None, gid=None, secondary_gids=(), home=None):
+        self.name = name
+        self.uid = uid
+        self.gid = gid
+        self.secondary_gids = secondary_gids
+        self.home = home
+
+
+class RhelGroup:
+    """An os-groups entry."""
+
+    __slots__ = ('name', 'gid')
+
+    def __init__(self, name, gid=None):
+        self.name = name
+        self.gid = gid
+
+
+class Compute:
+    """One compute-config entry. rhel_users/rhel_groups are None when the manifest has no such list."""
+
+    __slots__ = ('name', 'os', 'accounts', 'groups', 'rhel_users', 'rhel_groups')
+
+    def __init__(self, name, os, accounts=(), groups=(), rhel_users=None, rhel_groups=None):
+        self.name = name
+        self.os = os
+        self.accounts = accounts
+        self.groups = groups
+        self.rhel_users = rhel_users
+        self.rhel_groups = rhel_groups
+
+    def desired_state(self):
+        """Plain data for statestore.config_hash."""
+        state = {
+            'os': self.os,
+            'accounts': [[account.name, account.description, account.logon_type] for account in self.accounts],
+            'groups': [[group.name, group.description, list(group.members), group.action] for group in self.groups]
+        }
+        if self.rhel_users is not None:
+            state['rhel_users'] = [[user.name, user.uid, user.gid, list(user.secondary_gids), user.home]
+                                   for user in self.rhel_users]
+        if self.rhel_groups is not None:
+            state['rhel_groups'] = [[group.name, group.gid] for group in self.rhel_groups]
+        return state
+
+
+class _Checker:
+    """Collects errors while entries are read; where() names the entry being checked."""
+
+    def __init__(self):
+        self.errors = []
+
+    def entries(self, value, where):
+        # None (key missing or null) is kept as None so callers can tell it from an empty list
+        if value is None or isinstance(value, list):
+            return value
+        self.errors.append(f"{where}: expected a list, got {type(value).__name__}")
+        return []
+
+    def mapping(self, entry, where):
+        if isinstance(entry, dict):
+            return True
+        self.errors.append(f"{where}: expected a mapping, got {type(entry).__name__}")
+        return False
+
+    def required(self, entry, key, where):
+        if key not in entry:
+            self.errors.append(f"{where}: missing '{key}'")
+        return entry.get(key)
+
+
+def _where(compute_where, key, index, entry):
+    name = entry.get('account-name') or entry.get('group-name') or entry.get('user') or entry.get('group') \
+        if isinstance(entry, dict) else None
+    return f"{compute_where} {key}[{index}]" + (f" ({name})" if name else "")
+
+
+def _accounts(check, entries, where):
+    accounts = []
+    for index, entry in enumerate(entries or ()):
+        entry_where = _where(where, 'win-os-accounts', index, entry)
+        if check.mapping(entry, entry_where):
+            name = check.required(entry, 'account-name', entry_where)
+            description = check.required(entry, 'account-desc', entry_where)
+            logon_type = check.required(entry, 'logon-type', entry_where)
+            accounts.append(Account(intern_name(name), description, logon_type))
+    return tuple(accounts)
+
+
+def _groups(check, entries, where):
+    groups = []
+    for index, entry in enumerate(entries or ()):
+        entry_where = _where(where, 'win-os-groups', index, entry)
+        if not check.mapping(entry, entry_where):
+            continue
+        name = check.required(entry, 'group-name', entry_where)
+        description = check.required(entry, 'group-desc', entry_where)
+        members = check.required(entry, 'user-list', entry_where)
+        action = check.required(entry, 'user-list-action', entry_where)
+        if 'user-list' in entry and not isinstance(members, list):
+            check.errors.append(f"{entry_where}: user-list must be a list")
+            members = []
+        if 'user-list-action' in entry and action not in USER_LIST_ACTIONS:
+            check.errors.append(f"{entry_where}: user-list-action must be one of {', '.join(USER_LIST_ACTIONS)}, got {action!r}")
+        groups.append(Group(intern_name(name), description, tuple(intern_name(member) for member in members or ()), action))
+    return tuple(groups)
+
+
+def _rhel_users(check, entries, where):
+    if entries is None:
+        return None
+    users = []
+    for index, entry in enumerate(entries):
+        entry_where = _where(where, 'os-users', index, entry)
+        if not check.mapping(entry, entry_where):
+            continue
+        name = check.required(entry, 'user', entry_where)
+        secondary_gids = entry.get('secondary-gid') or ()
+        if not isinstance(secondary_gids, (list, tuple)):
+            check.errors.append(f"{entry_where}: secondary-gid must be a list")
+            secondary_gids = ()
+        users.append(RhelUser(intern_name(name), entry.get('uid'), entry.get('gid'), tuple(secondary_gids), entry.get('home')))
+    return tuple(users)
+
+
+def _rhel_groups(check, entries, where):
+    if entries is None:
+        return None
+    groups = []
+    for index, entry in enumerate(entries):
+        entry_where = _where(where, 'os-groups', index, entry)
+        if check.mapping(entry, entry_where):
+            groups.append(RhelGroup(intern_name(check.required(entry, 'group', entry_where)), entry.get('gid')))
+    return tuple(groups)
+
+
+def parse_computes(compute_config, classify_os, limits=None, source='compute-config'):
+    """Return {lowercase name: Compute} for the computes within limits; raise ManifestError listing every problem."""
+    check = _Checker()
+    computes = {}
+    for index, compute in enumerate(check.entries(compute_config, source) or ()):
+        where = f"compute-config[{index}]"
+        if not check.mapping(compute, where):
+            continue
+        name = check.required(compute, 'name', where)
+        if not isinstance(name, str):
+            if name is not None:
+                check.errors.append(f"{where}: name must be a string")
+            continue
+        name = intern_name(name.lower())
+        if limits is not None and not limits.computes(name):
+            continue
+        where = f"{where} ({name})"
+        os_name = check.required(compute, 'os', where)
+        os_type = classify_os(os_name) if isinstance(os_name, str) else 'unknown'
+
+        accounts = _accounts(check, check.entries(compute.get('win-os-accounts'), f"{where} win-os-accounts"), where)
+        groups = _groups(check, check.entries(compute.get('win-os-groups'), f"{where} win-os-groups"), where)
+        rhel_users = rhel_groups = None
+        if os_type == 'linux':
+            rhel_users = _rhel_users(check, check.entries(compute.get('os-users'), f"{where} os-users"), where)
+            rhel_groups = _rhel_groups(check, check.entries(compute.get('os-groups'), f"{where} os-groups"), where)
+        computes[name] = Compute(name, os_type, accounts, groups, rhel_users, rhel_groups)
+
+    if check.errors:
+        raise ManifestError(source, check.errors)
+    return computes
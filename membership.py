@@ -0,0 +1,78 @@
+import sys
+
+
+class MembershipDelta:
+    """Tracks user creations and group membership adds/removes for one compute.
+
+    Names are interned and every roster is kept as an insertion-ordered set
+    (a dict with None values), so lookups are O(1) and the generated output
+    keeps the order in which entries appeared in compute_mf.yml.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.added = {}
+        self.removed = {}
+
+    @staticmethod
+    def intern(name):
+        return sys.intern(str(name))
+
+    def add_user(self, username):
+        username = self.intern(username)
+        if username in self.users:
+            return False
+        self.users[username] = None
+        return True
+
+    def add(self, group_name, username):
+        group_name = self.intern(group_name)
+        username = self.intern(username)
+        self.removed.get(group_name, {}).pop(username, None)
+        members = self.added.setdefault(group_name, {})
+        if username in members:
+            return False
+        members[username] = None
+        return True
+
+    def remove(self, group_name, username):
+        # Removing a membership that was never added is not an error; the
+        # user may already be in the group on the host.
+        group_name = self.intern(group_name)
+        username = self.intern(username)
+        self.added.get(group_name, {}).pop(username, None)
+        members = self.removed.setdefault(group_name, {})
+        if username in members:
+            return False
+        members[username] = None
+        return True
+
+    def apply(self, group_name, user_list, user_list_action):
+        if user_list_action == 'add':
+            for user in user_list:
+                self.add(group_name, user)
+        elif user_list_action == 'remove':
+            for user in user_list:
+                self.remove(group_name, user)
+
+    @staticmethod
+    def _by_user(rosters):
+        result = {}
+        for group_name, members in rosters.items():
+            for user in members:
+                result.setdefault(user, []).append(group_name)
+        return result
+
+    def added_groups(self):
+        """Return {user: [groups]} for memberships to add."""
+        return self._by_user(self.added)
+
+    def removed_groups(self):
+        """Return {user: [groups]} for memberships to remove."""
+        return self._by_user(self.removed)
+
+    def diff(self):
+        """Return (added, removed) as lists of (user, group) pairs."""
+        added = [(user, group_name) for group_name, members in self.added.items() for user in members]
+        removed = [(user, group_name) for group_name, members in self.removed.items() for user in members]
+        return added, removed
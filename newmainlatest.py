@@ -2,7 +2,11 @@ import os
 import json
 import yaml
 import sys
-from prettytable import PrettyTable
+from reports import Section, open_report
+
+MACHINES = Section("machine", "Compute Machines", [("name", "Machine Name"), ("state", "State")])
+OS_GROUPS = Section("os-group", "Report of OS Groups", [("group", "Group Name"), ("description", "Description"),
+                                                         ("users", "Users"), ("action", "Action")])
 
 # Function to load YAML and JSON files from environment variables
 def load_configuration():
@@ -36,14 +40,16 @@ def process_machines():
         return []
 
     print("Processing compute machines and their states:")
-    table = PrettyTable(["Machine Name", "State"])
+    report = open_report("machines", [MACHINES])
+    report.begin()
 
     for machine in machines:
         name = machine.get("name", "Unknown")
         state = machine.get("state", "Unknown")
-        table.add_row([name, state])
+        report.record(MACHINES, (name, state))
 
-    print(table)
+    report.end()
+    report.close()
     return machines
 
 # Function to process os_groups from compute data
@@ -80,21 +86,28 @@ def save_json(entity_type, data):
     with open(output_file, "w") as out_file:
         json.dump({f"{entity_type}s": data}, out_file, indent=4)
 
-# Function to generate a report for os_groups
+# Function to generate a report for os_groups, one scope per compute so each
+# compute is written out as soon as its rows are known
 def generate_group_report(groups):
-    table = PrettyTable(["Compute Name", "Group Name", "Description", "Users", "Action"])
+    report = open_report("os_groups", [OS_GROUPS])
+    scope = None
 
     for group in groups:
-        table.add_row([
-            group["compute_name"],
+        if group["compute_name"] != scope:
+            if scope is not None:
+                report.end()
+            scope = group["compute_name"]
+            report.begin(scope)
+        report.record(OS_GROUPS, (
             group["group_name"],
             group["description"],
-            ", ".join(group["user_list"]),
+            group["user_list"],
             group["user_list_action"]
-        ])
+        ))
 
-    print("\nReport of OS Groups:")
-    print(table)
+    if scope is not None:
+        report.end()
+    report.close()
 
 # Main Execution
 if __name__ == "__main__":
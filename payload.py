@@ -0,0 +1,117 @@
+import os
+import json
+
+# Maps the text of json.dumps(data) straight to the file form of
+# json.dumps(data).replace('"', '\\"') as it appears inside the payload, so
+# the blob is escaped and encoded for the outer document in one pass.
+_BLOB_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\\\\\"'})
+
+
+class EscapedBlob(str):
+    """Compact JSON text that is written to the payload in escaped form."""
+
+    @classmethod
+    def dumps(cls, data):
+        return cls(json.dumps(data))
+
+    def encode_json(self):
+        return '"' + self.translate(_BLOB_ESCAPES) + '"'
+
+
+def encode_value(value):
+    if isinstance(value, EscapedBlob):
+        return value.encode_json()
+    return json.dumps(value)
+
+
+class NodeList:
+    """Collects listOfNodes entries for a payload file.
+
+    With dedupe enabled, computes whose task arguments and data blobs are
+    identical are merged into a single entry and their hostnames are joined
+    into one targetNodes list, so each unique block is emitted once. A
+    block's targetNodes can still grow until the last compute is added, so
+    the unique blocks are held until flush() and nothing is streamed before
+    then; memory is bounded by the number of unique blocks, not computes.
+    Without dedupe every entry is handed to the sink as soon as it is added.
+    """
+
+    def __init__(self, sink, dedupe=True):
+        self.sink = sink
+        self.dedupe = dedupe
+        self.entries = []
+        self.blocks = {}
+
+    def add(self, hostnames, payload):
+        if not self.dedupe:
+            self.sink({"targetNodes": ",".join(hostnames), **payload})
+            return
+
+        fingerprint = tuple(payload.items())
+        entry = self.blocks.get(fingerprint)
+        if entry is None:
+            entry = {"targetNodes": [], **payload}
+            self.blocks[fingerprint] = entry
+            self.entries.append(entry)
+        entry["targetNodes"].extend(hostnames)
+
+    def flush(self):
+        for entry in self.entries:
+            self.sink(dict(entry, targetNodes=",".join(entry["targetNodes"])))
+        self.entries = []
+        self.blocks = {}
+
+
+class NodeListWriter:
+    """Writes a payload file incrementally, one listOfNodes entry at a time.
+
+    The header fields are written up front and listOfNodes is always the
+    last key. The indented form is byte-identical to
+    json.dump(payload, file, indent=4); compact=True drops all whitespace.
+    Entries go to file_path + ".tmp", which replaces file_path only when the
+    block exits without an exception, so a failed run never leaves a
+    well-formed but truncated payload behind.
+    """
+
+    def __init__(self, file_path, header, compact=False):
+        self.file_path = file_path
+        self.header = header
+        self.compact = compact
+        self.temp_path = file_path + ".tmp"
+        self.count = 0
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.temp_path, "w")
+        if self.compact:
+            fields = [f'{json.dumps(key)}:{encode_value(value)}' for key, value in self.header.items()]
+            self.file.write("{" + "".join(field + "," for field in fields) + '"listOfNodes":[')
+        else:
+            self.file.write("{\n")
+            for key, value in self.header.items():
+                self.file.write(f'    {json.dumps(key)}: {encode_value(value)},\n')
+            self.file.write('    "listOfNodes": [')
+        return self
+
+    def write(self, entry):
+        if self.compact:
+            fields = [f'{json.dumps(key)}:{encode_value(value)}' for key, value in entry.items()]
+            self.file.write(("," if self.count else "") + "{" + ",".join(fields) + "}")
+        else:
+            fields = [f'            {json.dumps(key)}: {encode_value(value)}' for key, value in entry.items()]
+            body = "{\n" + ",\n".join(fields) + "\n        }" if fields else "{}"
+            self.file.write(("," if self.count else "") + "\n        " + body)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.file.close()
+            os.remove(self.temp_path)
+            return False
+        if self.compact:
+            self.file.write("]}")
+        else:
+            self.file.write("\n    ]\n}" if self.count else "]\n}")
+        self.file.close()
+        os.replace(self.temp_path, self.file_path)
+        return False
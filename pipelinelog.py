@@ -0,0 +1,160 @@
+"""Buffered pipeline log: console lines, ##vso issues and a JSON Lines side log.
+
+Console output is collected and written in batches (every FLUSH_LINES
+lines or FLUSH_SECONDS, and at exit), so thousands of hosts cost a few
+writes instead of one per line. A timer flushes a batch that stops
+growing, so progress lines never wait for the next log call. Warnings and errors become
+##vso[task.logissue] commands. Issues with the same message shape (digits
+and quoted names masked, as in summary.error_bucket) are printed
+REPEAT_LIMIT times and then only counted. After MAX_ISSUES issues,
+further ones are printed as plain lines. Every record, including the
+ones held back from the console, is written in full to the side log.
+
+    from pipelinelog import log
+    log.info(f'Processing Host: {compute_name}', compute=compute_name, hosts=hostnames)
+    log.warning(f'No os-groups found for compute-name: {compute_name}', compute=compute_name)
+    log.write(str(table))
+    open_report(name, sections, stream=log.console, warn=log.warning)
+    log.close()
+
+Report warning sections go through warn=log.warning so they are capped
+and deduplicated like any other issue; log.console carries plain text only.
+
+Environment:
+    logLevel     debug, info, warning or error (default: info)
+    logPath      JSON Lines side log (default: pipeline_log.jsonl; empty disables it)
+    maxIssues    ##vso issues per run before falling back to plain lines (default: 100)
+    repeatLimit  times one message shape is printed before it is only counted (default: 5)
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from collections import Counter
+
+from summary import error_bucket
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+FLUSH_LINES = 500
+FLUSH_SECONDS = 2.0
+
+
+class PipelineLog:
+    def __init__(self, level=None, path=None, max_issues=None, repeat_limit=None, stream=None):
+        self.level = LEVELS.get((level or os.getenv('logLevel', 'info')).lower(), LEVELS['info'])
+        self.path = os.getenv('logPath', 'pipeline_log.jsonl') if path is None else path
+        self.max_issues = int(os.getenv('maxIssues', '100') if max_issues is None else max_issues)
+        self.repeat_limit = int(os.getenv('repeatLimit', '5') if repeat_limit is None else repeat_limit)
+        self.stream = stream
+        self.lines = []
+        self.last_flush = time.monotonic()
+        self.timer = None
+        self.issues = 0
+        self.repeats = Counter()
+        self.suppressed = Counter()
+        self.side_log = None
+        self.side_log_mode = 'w'  # a run starts a new side log; reopening after close() appends
+        self.lock = threading.RLock()
+        self.console = ConsoleStream(self)
+
+    def log(self, level, message, **fields):
+        """Record message at level; fields only go to the side log."""
+        with self.lock:
+            self.side(level, message, fields)
+            if LEVELS[level] < self.level:
+                return
+            if level in ('warning', 'error'):
+                bucket = (level, error_bucket(message))
+                self.repeats[bucket] += 1
+                if self.repeats[bucket] > self.repeat_limit:
+                    self.suppressed[bucket] += 1
+                    return
+                if self.issues < self.max_issues:
+                    self.issues += 1
+                    self.write(f'##vso[task.logissue type={level}]{message}')
+                    return
+                level_prefix = 'ERROR' if level == 'error' else 'WARNING'
+                message = f'{level_prefix}: {message}'
+            self.write(message)
+
+    def debug(self, message, **fields):
+        self.log('debug', message, **fields)
+
+    def info(self, message, **fields):
+        self.log('info', message, **fields)
+
+    def warning(self, message, **fields):
+        self.log('warning', message, **fields)
+
+    def error(self, message, **fields):
+        self.log('error', message, **fields)
+
+    def write(self, text):
+        """Queue console text as is (tables, ##vso commands)."""
+        with self.lock:
+            self.lines.append(text)
+            waited = time.monotonic() - self.last_flush
+            if len(self.lines) >= FLUSH_LINES or waited >= FLUSH_SECONDS:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(FLUSH_SECONDS - waited, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def side(self, level, message, fields):
+        if not self.path:
+            return
+        if self.side_log is None:
+            self.side_log = open(self.path, self.side_log_mode, encoding='utf-8')
+            self.side_log_mode = 'a'
+        record = {'time': time.time(), 'level': level, 'message': message}
+        record.update(fields)
+        self.side_log.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.lines:
+                stream = self.stream or sys.stdout
+                stream.write('\n'.join(self.lines) + '\n')
+                stream.flush()
+                self.lines = []
+            self.last_flush = time.monotonic()
+            if self.side_log is not None:
+                self.side_log.flush()
+
+    def close(self):
+        """Report suppressed repeats, then flush and close the side log."""
+        with self.lock:
+            suppressed, self.suppressed = self.suppressed, Counter()
+            for (level, bucket), count in suppressed.items():
+                detail = f' (see {self.path})' if self.path else ''
+                self.write(f'{level.upper()}: {count} more like "{bucket}" not shown{detail}')
+            self.flush()
+            if self.side_log is not None:
+                self.side_log.close()
+                self.side_log = None
+
+
+class ConsoleStream:
+    """File-like view of a PipelineLog for writers that expect a stream, such as the reports backends."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def write(self, text):
+        if text:
+            self.log.write(text[:-1] if text.endswith('\n') else text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+log = PipelineLog()
+atexit.register(log.close)
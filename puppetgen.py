@@ -0,0 +1,97 @@
+"""Render parsed user/group records straight into a Puppet manifest.
+
+Each host gets the users and groups of every entry that names it, and
+hosts that end up with identical resources share one node block, so the
+catalog for each host holds only its own, already-resolved resources and
+Puppet has no JSON to read or parse at compile time.
+"""
+
+
+def puppet_string(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def puppet_array(values):
+    return "[" + ", ".join(puppet_string(value) for value in values) + "]"
+
+
+def ensure_for(action):
+    return "absent" if action == "delete" else "present"
+
+
+def group_resource(group, indent="  "):
+    return "\n".join([
+        f"{indent}group {{ {puppet_string(group.groupname)}:",
+        f"{indent}  ensure => {ensure_for(group.action)},",
+        f"{indent}}}",
+    ])
+
+
+def user_resource(user, defined_groups, indent="  "):
+    lines = [
+        f"{indent}user {{ {puppet_string(user.username)}:",
+        f"{indent}  ensure     => {ensure_for(user.action)},",
+    ]
+    if user.action != "delete":
+        groups = [group_name for group_name in user.groups if group_name]
+        lines.append(f"{indent}  comment    => {puppet_string(user.fullname)},")
+        if user.password:
+            lines.append(f"{indent}  password   => Sensitive({puppet_string(user.password)}),")
+        lines.append(f"{indent}  groups     => {puppet_array(groups)},")
+        lines.append(f"{indent}  membership => minimum,")
+        required = [group_name for group_name in groups if group_name in defined_groups]
+        if required:
+            lines.append(f"{indent}  require    => [" + ", ".join(f"Group[{puppet_string(name)}]" for name in required) + "],")
+    lines.append(f"{indent}}}")
+    return "\n".join(lines)
+
+
+def node_body(users, groups):
+    # Puppet rejects duplicate resource titles, so the first record per name wins.
+    unique_groups = {}
+    for group in groups:
+        unique_groups.setdefault(group.groupname, group)
+    unique_users = {}
+    for user in users:
+        unique_users.setdefault(user.username, user)
+
+    defined_groups = {name for name, group in unique_groups.items() if group.action != "delete"}
+    resources = [group_resource(group) for group in unique_groups.values()]
+    resources += [user_resource(user, defined_groups) for user in unique_users.values()]
+    return "\n\n".join(resources)
+
+
+def render_manifest(node_groups):
+    """Render [(target_nodes, users, groups), ...] as one manifest.
+
+    target_nodes is a list of hostnames; an empty list means the default
+    node. Puppet allows one node definition per host, so each host first
+    collects the users and groups of every entry naming it; hosts whose
+    resources then come out identical share one node block.
+    """
+    entries_by_host = {}
+    for index, (target_nodes, _, _) in enumerate(node_groups):
+        for node in target_nodes or ["default"]:
+            entries_by_host.setdefault(node.lower(), []).append(index)
+
+    # Hosts named by the same entries get the same body; render it once per entry set
+    hosts_by_entries = {}
+    for node, indexes in entries_by_host.items():
+        hosts_by_entries.setdefault(tuple(indexes), []).append(node)
+
+    blocks = {}
+    for indexes, nodes in hosts_by_entries.items():
+        users = [user for index in indexes for user in node_groups[index][1]]
+        groups = [group for index in indexes for group in node_groups[index][2]]
+        blocks.setdefault(node_body(users, groups), []).extend(nodes)
+
+    rendered = []
+    for body, nodes in blocks.items():
+        names = ", ".join("default" if node == "default" else puppet_string(node) for node in nodes)
+        rendered.append(f"node {names} {{\n{body}\n}}\n")
+    return "\n".join(rendered)
+
+
+def write_manifest(path, node_groups):
+    with open(path, "w") as manifest:
+        manifest.write(render_manifest(node_groups))
@@ -0,0 +1,323 @@
+"""Report backends: text, PrettyTable, JSON Lines, CSV and HTML.
+
+A report is a list of Sections. Callers open a scope (usually a compute),
+write records against those sections and end the scope. Each backend
+renders a scope as soon as it ends, so nothing accumulates across
+computes. PrettyTable is only imported when the table format is chosen.
+
+    report = open_report("windows_users", SECTIONS)   # reportFormat / reportDir
+    report.begin("compute-a")
+    report.record(USERS_ADDED, ("john", ["Administrators"]))
+    report.end()
+    report.close()
+"""
+
+import os
+import sys
+import csv
+import json
+import html
+
+FORMATS = ('text', 'table', 'jsonl', 'csv', 'html')
+
+
+class Section:
+    """One kind of record: its key in machine formats, its table title and its fields.
+
+    fields is a list of (key, header) pairs. empty is printed by the table
+    format when a scope has no records for the section. Records of a
+    'warning' section are raised as pipeline warnings in the log formats:
+    through the warn callable when one is given (such as
+    pipelinelog.log.warning, which caps and dedupes them), else as
+    ##vso[task.logissue] lines on the stream.
+    """
+
+    __slots__ = ('kind', 'title', 'keys', 'headers', 'empty', 'level')
+
+    def __init__(self, kind, title, fields, empty=None, level=None):
+        self.kind = kind
+        self.title = title
+        self.keys = [key for key, _ in fields]
+        self.headers = [header for _, header in fields]
+        self.empty = empty
+        self.level = level
+
+
+def format_value(value):
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(item) for item in value)
+    return '' if value is None else str(value)
+
+
+def write_lines(stream, lines, warn):
+    """Write lines to stream in order, handing each Issue to warn."""
+    plain = []
+    for line in lines:
+        if isinstance(line, Issue):
+            if plain:
+                stream.write('\n'.join(plain) + '\n')
+                plain = []
+            warn(line.message, scope=line.scope)
+        else:
+            plain.append(line)
+    if plain:
+        stream.write('\n'.join(plain) + '\n')
+
+
+class Issue:
+    """A warning-section record waiting to be passed to warn, in line order."""
+
+    __slots__ = ('message', 'scope')
+
+    def __init__(self, message, scope):
+        self.message = message
+        self.scope = scope
+
+
+def warning_line(message, scope, warn):
+    return Issue(message, scope) if warn else f"##vso[task.logissue type=warning]{message}"
+
+
+def text_value(value):
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(item) for item in value)
+    value = format_value(value)
+    return f'"{value}"' if ' ' in value else value
+
+
+class TextReport:
+    """One line per record: '<scope> <kind> <first field> key=value ...'.
+
+    Empty fields are left out, values with spaces are quoted and a record
+    of a 'warning' section becomes one pipeline warning.
+    """
+
+    def __init__(self, sections, stream=None, warn=None):
+        self.stream = stream or sys.stdout
+        self.warn = warn
+        self.scope = ''
+        self.lines = []
+
+    def begin(self, scope=''):
+        self.scope = scope
+        self.lines = []
+
+    def record(self, section, values):
+        first = format_value(values[0])
+        extra = ' '.join(f"{key}={text_value(value)}"
+                         for key, value in zip(section.keys[1:], values[1:]) if value not in (None, '', [], ()))
+        line = ' '.join(part for part in (self.scope, section.kind, first, extra) if part)
+        if section.level == 'warning':
+            line = warning_line(line, self.scope, self.warn)
+        self.lines.append(line)
+
+    def end(self):
+        write_lines(self.stream, self.lines, self.warn)
+        self.lines = []
+
+    def close(self):
+        self.stream.flush()
+
+
+class TableReport:
+    """A PrettyTable per section, printed when the scope ends."""
+
+    def __init__(self, sections, stream=None, warn=None):
+        from prettytable import PrettyTable
+        self.table_class = PrettyTable
+        self.sections = sections
+        self.stream = stream or sys.stdout
+        self.warn = warn
+        self.scope = ''
+        self.rows = {}
+
+    def begin(self, scope=''):
+        self.scope = scope
+        self.rows = {section.kind: [] for section in self.sections}
+
+    def record(self, section, values):
+        self.rows[section.kind].append(values)
+
+    def end(self):
+        out = []
+        if self.scope:
+            out.append(f"===========================SUMMARY for {self.scope}=====================")
+        for section in self.sections:
+            rows = self.rows.get(section.kind)
+            if not rows:
+                if section.empty:
+                    out.append(section.empty)
+                continue
+            if section.level == 'warning':
+                if self.warn:
+                    out.append(f"========={section.title}=======")
+                    out.extend(Issue(format_value(values[0]), self.scope) for values in rows)
+                else:
+                    out.append(f"##vso[task.logissue type=warning]========={section.title}=======")
+                    out.extend(format_value(values[0]) for values in rows)
+                continue
+            table = self.table_class(section.headers)
+            for values in rows:
+                table.add_row([format_value(value) for value in values])
+            out.append(f"{section.title}:")
+            out.append(table.get_string())
+        out.append('')
+        write_lines(self.stream, out, self.warn)
+        self.rows = {}
+
+    def close(self):
+        self.stream.flush()
+
+
+class JsonlReport:
+    """One JSON object per record: {"scope", "kind", <field>: <value>, ...}."""
+
+    def __init__(self, sections, path):
+        self.path = path
+        self.file = open(path, 'w')
+        self.scope = ''
+        self.lines = []
+
+    def begin(self, scope=''):
+        self.scope = scope
+        self.lines = []
+
+    def record(self, section, values):
+        entry = {'scope': self.scope, 'kind': section.kind}
+        entry.update(zip(section.keys, values))
+        self.lines.append(json.dumps(entry, default=list))
+
+    def end(self):
+        if self.lines:
+            self.file.write('\n'.join(self.lines) + '\n')
+        self.lines = []
+
+    def close(self):
+        self.file.close()
+
+
+class CsvReport:
+    """One CSV file per section, <base>_<kind>.csv, created on its first record."""
+
+    def __init__(self, sections, base_path):
+        self.base_path = base_path
+        self.scope = ''
+        self.files = {}
+        self.writers = {}
+
+    def begin(self, scope=''):
+        self.scope = scope
+
+    def record(self, section, values):
+        writer = self.writers.get(section.kind)
+        if writer is None:
+            file = open(f"{self.base_path}_{section.kind}.csv", 'w', newline='')
+            writer = csv.writer(file)
+            writer.writerow(['Scope'] + section.headers)
+            self.files[section.kind] = file
+            self.writers[section.kind] = writer
+        writer.writerow([self.scope] + [format_value(value) for value in values])
+
+    def end(self):
+        pass
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+
+class HtmlReport:
+    """A single HTML page with a heading and a table per section for each scope."""
+
+    def __init__(self, sections, path, title='Report'):
+        self.sections = sections
+        self.file = open(path, 'w')
+        self.scope = ''
+        self.rows = {}
+        self.file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head><body>\n")
+
+    def begin(self, scope=''):
+        self.scope = scope
+        self.rows = {section.kind: [] for section in self.sections}
+
+    def record(self, section, values):
+        self.rows[section.kind].append(values)
+
+    def end(self):
+        out = []
+        if self.scope:
+            out.append(f"<h2>{html.escape(self.scope)}</h2>")
+        for section in self.sections:
+            rows = self.rows.get(section.kind)
+            if not rows:
+                continue
+            out.append(f"<h3>{html.escape(section.title)}</h3>\n<table border=\"1\">")
+            out.append('<tr>' + ''.join(f"<th>{html.escape(header)}</th>" for header in section.headers) + '</tr>')
+            for values in rows:
+                out.append('<tr>' + ''.join(f"<td>{html.escape(format_value(value))}</td>" for value in values) + '</tr>')
+            out.append('</table>')
+        if out:
+            self.file.write('\n'.join(out) + '\n')
+        self.rows = {}
+
+    def close(self):
+        self.file.write("</body></html>\n")
+        self.file.close()
+
+
+class MultiReport:
+    """Send every call to several backends, e.g. text to the log plus a JSONL artifact."""
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def begin(self, scope=''):
+        for backend in self.backends:
+            backend.begin(scope)
+
+    def record(self, section, values):
+        for backend in self.backends:
+            backend.record(section, values)
+
+    def end(self):
+        for backend in self.backends:
+            backend.end()
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+def open_report(name, sections, formats=None, directory=None, stream=None, warn=None):
+    """Open the backends listed in formats (comma separated, default $reportFormat or 'text').
+
+    File formats are written to <directory>/<name>.<ext>, with directory
+    defaulting to $reportDir or the working directory. warn(message, scope=...)
+    receives the records of warning sections in the text and table formats.
+    """
+    formats = formats or os.getenv("reportFormat", "text")
+    directory = directory or os.getenv("reportDir", ".")
+    base_path = os.path.join(directory, name)
+
+    backends = []
+    for report_format in filter(None, (item.strip().lower() for item in formats.split(','))):
+        if report_format == 'text':
+            backends.append(TextReport(sections, stream, warn))
+        elif report_format == 'table':
+            backends.append(TableReport(sections, stream, warn))
+        elif report_format == 'jsonl':
+            backends.append(JsonlReport(sections, f"{base_path}.jsonl"))
+        elif report_format == 'csv':
+            backends.append(CsvReport(sections, base_path))
+        elif report_format == 'html':
+            backends.append(HtmlReport(sections, f"{base_path}.html", name))
+        else:
+            raise ValueError(f"Unknown report format '{report_format}', expected one of: {', '.join(FORMATS)}")
+    return MultiReport(backends)
@@ -0,0 +1,57 @@
+"""Push every branch (and optionally tag) of a repository to several remotes.
+
+Replaces the hard-coded repo1/repo2/repo3 remotes of 01-pushrepopipeline.
+Pushes run concurrently; a PAT taken from the environment is injected
+into https remote URLs that carry no credentials and masked in the log.
+
+Usage:
+    PAT=... python reposync.py https://dev.azure.com/ORG/PROJECT/_git/repo1 https://dev.azure.com/ORG/PROJECT/_git/repo2
+"""
+
+import sys
+import subprocess
+from urllib.parse import urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor
+
+
+def with_credentials(url, pat):
+    parts = urlsplit(url)
+    if not pat or parts.scheme != 'https' or '@' in parts.netloc:
+        return url
+    return urlunsplit(parts._replace(netloc=f"{pat}@{parts.netloc}"))
+
+
+def mask(text, pat):
+    return text.replace(pat, '***') if pat else text
+
+
+def push(source, url, pat=None, tags=False):
+    """Push all branches (and tags) of source to url; return (url, returncode, output)."""
+    target = with_credentials(url, pat)
+    output = []
+    returncode = 0
+    for refs in (['--all'], ['--tags']) if tags else (['--all'],):
+        result = subprocess.run(['git', '-C', source, 'push', target, *refs], capture_output=True, text=True)
+        output.append(mask(result.stdout + result.stderr, pat).strip())
+        returncode = returncode or result.returncode
+    return url, returncode, '\n'.join(filter(None, output))
+
+
+def sync_repositories(remotes, source='.', pat=None, tags=False, max_workers=4):
+    """Push source to every remote concurrently; return the remotes that failed."""
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for url, returncode, output in pool.map(lambda url: push(source, url, pat, tags), remotes):
+            status = 'ok' if returncode == 0 else 'failed'
+            print(f"{url}: {status}")
+            if output:
+                print(output)
+            if returncode != 0:
+                failed.append(url)
+                print(f"##vso[task.logissue type=error]Push to {url} failed")
+    return failed
+
+
+if __name__ == "__main__":
+    from adotools.cli import main
+    raise SystemExit(main(["repo-sync", *sys.argv[1:]]))
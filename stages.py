@@ -0,0 +1,81 @@
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """A pipeline step (puppet apply, a PowerShell script, ...) run as one process.
+
+    A stage starts once every stage named in depends_on has succeeded and
+    is skipped if any of them failed.
+    """
+
+    def __init__(self, name, command, depends_on=()):
+        self.name = name
+        self.command = command
+        self.depends_on = tuple(depends_on)
+        self.status = 'pending'
+        self.returncode = None
+        self.error = ''
+        self.started_at = None
+        self.duration = 0.0
+
+    def run(self):
+        self.started_at = time.monotonic()
+        try:
+            self.returncode = subprocess.run(self.command).returncode
+            self.status = 'ok' if self.returncode == 0 else 'failed'
+        except OSError as e:
+            self.status = 'failed'
+            self.error = str(e)
+        self.duration = time.monotonic() - self.started_at
+        return self
+
+
+def puppet_stage(name, manifest, depends_on=()):
+    return Stage(name, ["puppet", "apply", manifest], depends_on)
+
+
+def powershell_stage(name, script_path, arguments=(), depends_on=()):
+    command = ["powershell.exe", "-NoProfile", "-NonInteractive", "-File", script_path, *arguments]
+    return Stage(name, command, depends_on)
+
+
+def run_stages(stages, max_workers=None):
+    """Run stages concurrently where their dependencies allow.
+
+    Returns the stages in the order given, each with status, returncode
+    and wall-clock duration filled in.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [name for name in stage.depends_on if name not in by_name]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stage(s): {', '.join(missing)}")
+
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1) as pool:
+        while pending or running:
+            for stage in list(pending):
+                dependencies = [by_name[name] for name in stage.depends_on]
+                if any(dep.status in ('failed', 'skipped') for dep in dependencies):
+                    stage.status = 'skipped'
+                    stage.error = 'dependency failed'
+                    pending.remove(stage)
+                elif all(dep.status == 'ok' for dep in dependencies):
+                    stage.status = 'running'
+                    running[pool.submit(stage.run)] = stage
+                    pending.remove(stage)
+
+            if not running:
+                if pending:
+                    names = ', '.join(stage.name for stage in pending)
+                    raise ValueError(f"Stage dependency cycle between: {names}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                future.result()
+    return stages
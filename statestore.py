@@ -0,0 +1,166 @@
+"""SQLite record of the user/group state applied to each host.
+
+Generators that only write payloads stage what they generated; the staged
+state becomes the applied state once the deploy confirms it, so a failed
+deploy is retried on the next run instead of being skipped.
+
+Usage:
+    python statestore.py --db fleet_state.db --confirm
+    python statestore.py --db fleet_state.db --confirm --host WIN-SRV01
+    python statestore.py --db fleet_state.db --group Administrators
+    python statestore.py --db fleet_state.db --host WIN-SRV01
+    python statestore.py --db fleet_state.db --user john.doe
+"""
+
+import time
+import json
+import sqlite3
+import hashlib
+import argparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    compute TEXT NOT NULL,
+    host TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    source TEXT NOT NULL,
+    applied_at REAL NOT NULL,
+    PRIMARY KEY (compute, host)
+);
+CREATE TABLE IF NOT EXISTS users (
+    compute TEXT NOT NULL,
+    host TEXT NOT NULL,
+    user TEXT NOT NULL,
+    PRIMARY KEY (compute, host, user)
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    compute TEXT NOT NULL,
+    host TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    user TEXT NOT NULL,
+    PRIMARY KEY (compute, host, grp, user)
+);
+CREATE TABLE IF NOT EXISTS pending (
+    compute TEXT NOT NULL,
+    host TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    users TEXT NOT NULL,
+    memberships TEXT NOT NULL,
+    source TEXT NOT NULL,
+    generated_at REAL NOT NULL,
+    PRIMARY KEY (compute, host)
+);
+CREATE INDEX IF NOT EXISTS memberships_by_group ON memberships (grp, user);
+CREATE INDEX IF NOT EXISTS memberships_by_user ON memberships (user);
+"""
+
+
+def config_hash(config):
+    """Stable hash of a JSON-serialisable desired-state description."""
+    encoded = json.dumps(config, sort_keys=True, separators=(',', ':'), default=list)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class StateStore:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.conn.close()
+
+    def applied_hashes(self, compute):
+        rows = self.conn.execute('SELECT host, config_hash FROM hosts WHERE compute = ?', (compute,))
+        return dict(rows.fetchall())
+
+    def is_current(self, compute, host, desired_hash):
+        row = self.conn.execute('SELECT config_hash FROM hosts WHERE compute = ? AND host = ?', (compute, host)).fetchone()
+        return row is not None and row[0] == desired_hash
+
+    def changed_hosts(self, compute, hosts, desired_hash):
+        """Return the hosts whose recorded hash differs from desired_hash, in order."""
+        applied = self.applied_hashes(compute)
+        return [host for host in hosts if applied.get(host) != desired_hash]
+
+    def record(self, compute, hosts, desired_hash, users=(), memberships=(), source='apply'):
+        """Replace the recorded state of each host with the given users and (user, group) pairs."""
+        now = time.time()
+        users = list(users)
+        memberships = list(memberships)
+        with self.conn:
+            for host in hosts:
+                self._replace(compute, host, desired_hash, users, memberships, source, now)
+
+    def _replace(self, compute, host, desired_hash, users, memberships, source, now):
+        self.conn.execute('DELETE FROM users WHERE compute = ? AND host = ?', (compute, host))
+        self.conn.execute('DELETE FROM memberships WHERE compute = ? AND host = ?', (compute, host))
+        self.conn.executemany('INSERT OR IGNORE INTO users VALUES (?, ?, ?)',
+                              ((compute, host, user) for user in users))
+        self.conn.executemany('INSERT OR IGNORE INTO memberships VALUES (?, ?, ?, ?)',
+                              ((compute, host, group_name, user) for user, group_name in memberships))
+        self.conn.execute('INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?)',
+                          (compute, host, desired_hash, source, now))
+
+    def stage(self, compute, hosts, desired_hash, users=(), memberships=(), source='generate'):
+        """Hold generated state for hosts until confirm(); changed_hosts() still compares against applied state."""
+        now = time.time()
+        users = json.dumps(list(users))
+        memberships = json.dumps([list(pair) for pair in memberships])
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  ((compute, host, desired_hash, users, memberships, source, now) for host in hosts))
+
+    def confirm(self, hosts=None):
+        """Record the staged state of hosts (default: all) as applied; return how many hosts were confirmed."""
+        query = 'SELECT compute, host, config_hash, users, memberships, source FROM pending'
+        params = []
+        if hosts is not None:
+            hosts = list(hosts)
+            query += ' WHERE host IN (' + ', '.join('?' * len(hosts)) + ')'
+            params = hosts
+        now = time.time()
+        with self.conn:
+            rows = self.conn.execute(query, params).fetchall()
+            for compute, host, desired_hash, users, memberships, source in rows:
+                self._replace(compute, host, desired_hash, json.loads(users), json.loads(memberships), source, now)
+                self.conn.execute('DELETE FROM pending WHERE compute = ? AND host = ?', (compute, host))
+        return len(rows)
+
+    def members(self, group_name=None, host=None, user=None):
+        """Return (compute, host, group, user) rows matching the given filters."""
+        query = 'SELECT compute, host, grp, user FROM memberships'
+        clauses = []
+        params = []
+        for column, value in (('grp', group_name), ('host', host), ('user', user)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        return self.conn.execute(query + ' ORDER BY compute, host, grp, user', params).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query recorded group memberships without contacting hosts")
+    parser.add_argument("--db", required=True, help="Path to the state database")
+    parser.add_argument("--confirm", action="store_true", help="Record staged state as applied (run after a successful deploy)")
+    parser.add_argument("--group", help="Only this group")
+    parser.add_argument("--host", help="Only this host")
+    parser.add_argument("--user", help="Only this user")
+    args = parser.parse_args()
+
+    with StateStore(args.db) as store:
+        if args.confirm:
+            confirmed = store.confirm([args.host] if args.host else None)
+            print(f"Confirmed staged state for {confirmed} host(s)")
+        else:
+            for compute, host, group_name, user in store.members(args.group, args.host, args.user):
+                print(f"{compute}\t{host}\t{group_name}\t{user}")
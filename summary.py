@@ -0,0 +1,179 @@
+"""Estate-wide change summary, built while computes are processed.
+
+Counters are kept per compute, group, user and OS, and errors are bucketed
+by their message with digits and quoted names masked, so the same failure
+on two hundred hosts is one bucket with a count. The summary is written
+once as compact JSON and can be published as pipeline variables.
+
+    summary = ChangeSummary()
+    summary.compute("compute-a", "windows", hostnames)
+    summary.membership("compute-a", "Administrators", "john", "add")
+    summary.error("compute-a", "Access is denied", host="WIN-SRV01")
+    summary.write("change_summary.json")
+    summary.publish()
+"""
+
+import re
+import json
+from collections import Counter, defaultdict
+
+_VARIABLE_NAMES = (
+    ('computes', 'Computes'),
+    ('hosts', 'Hosts'),
+    ('users_created', 'UsersCreated'),
+    ('groups_created', 'GroupsCreated'),
+    ('members_added', 'MembersAdded'),
+    ('members_removed', 'MembersRemoved'),
+    ('skipped', 'SkippedComputes'),
+    ('errors', 'Errors'),
+)
+
+_BUCKET_MASKS = (
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "'*'"),
+    (re.compile(r'\d+'), 'N'),
+)
+
+MAX_BUCKET_SAMPLES = 20
+
+
+def escape_variable(value):
+    """Escape a JSON document for a ##vso[task.setvariable] value."""
+    return value.replace('"', '\\"')
+
+
+def error_bucket(message):
+    bucket = message.strip().splitlines()[0] if message.strip() else ''
+    for pattern, replacement in _BUCKET_MASKS:
+        bucket = pattern.sub(replacement, bucket)
+    return bucket[:200]
+
+
+class ChangeSummary:
+    def __init__(self):
+        self.totals = Counter()
+        self.computes = defaultdict(Counter)
+        self.compute_os = {}
+        self.groups = defaultdict(Counter)
+        self.users = defaultdict(Counter)
+        self.os = defaultdict(Counter)
+        self.buckets = {}
+        self.pairs = {'add': {}, 'remove': {}}
+
+    def compute(self, compute_name, os_type, hostnames=()):
+        host_count = len(hostnames)
+        self.compute_os[compute_name] = os_type
+        self.computes[compute_name]['hosts'] += host_count
+        self.os[os_type]['computes'] += 1
+        self.os[os_type]['hosts'] += host_count
+        self.totals['computes'] += 1
+        self.totals['hosts'] += host_count
+
+    def skipped(self, compute_name, reason):
+        self.computes[compute_name]['skipped'] += 1
+        self.totals['skipped'] += 1
+        self.error(compute_name, reason, level='skipped')
+
+    def user_created(self, compute_name, user):
+        self.computes[compute_name]['users_created'] += 1
+        self.users[user]['created'] += 1
+        self.totals['users_created'] += 1
+
+    def group_created(self, compute_name, group_name):
+        self.computes[compute_name]['groups_created'] += 1
+        self.groups[group_name]['created'] += 1
+        self.totals['groups_created'] += 1
+
+    def membership(self, compute_name, group_name, user, action):
+        if action in self.pairs:
+            self.pairs[action].setdefault((user, group_name), None)
+        if action == 'add':
+            self.computes[compute_name]['members_added'] += 1
+            self.groups[group_name]['added'] += 1
+            self.users[user]['added_to'] += 1
+            self.totals['members_added'] += 1
+        elif action == 'remove':
+            self.computes[compute_name]['members_removed'] += 1
+            self.groups[group_name]['removed'] += 1
+            self.users[user]['removed_from'] += 1
+            self.totals['members_removed'] += 1
+
+    def error(self, compute_name, message, host=None, level='error'):
+        key = (level, error_bucket(message))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {'level': level, 'bucket': key[1], 'count': 0, 'example': message,
+                                          'computes': {}, 'hosts': {}}
+        bucket['count'] += 1
+        if len(bucket['computes']) < MAX_BUCKET_SAMPLES:
+            bucket['computes'].setdefault(compute_name, None)
+        if host and len(bucket['hosts']) < MAX_BUCKET_SAMPLES:
+            bucket['hosts'].setdefault(host, None)
+        if level == 'error':
+            self.computes[compute_name]['errors'] += 1
+            self.totals['errors'] += 1
+
+    def memberships(self, action):
+        """Distinct (user, group) pairs seen with the given action, in first-seen order."""
+        return list(self.pairs[action])
+
+    def to_dict(self):
+        computes = {}
+        for compute_name, counts in self.computes.items():
+            computes[compute_name] = {'os': self.compute_os.get(compute_name, 'unknown'), **counts}
+        errors = sorted(self.buckets.values(), key=lambda bucket: -bucket['count'])
+        return {
+            'totals': dict(self.totals),
+            'computes': computes,
+            'groups': {name: dict(counts) for name, counts in self.groups.items()},
+            'users': {name: dict(counts) for name, counts in self.users.items()},
+            'os': {name: dict(counts) for name, counts in self.os.items()},
+            'errors': [{**bucket, 'computes': list(bucket['computes']), 'hosts': list(bucket['hosts'])} for bucket in errors]
+        }
+
+    def write(self, path):
+        with open(path, 'w') as summary_file:
+            json.dump(self.to_dict(), summary_file, separators=(',', ':'))
+
+    def publish(self, prefix='Summary', path=None):
+        """Print totals (and the artifact path) as ##vso pipeline variables."""
+        for key, name in _VARIABLE_NAMES:
+            print(f'##vso[task.setvariable variable={prefix}{name};]{self.totals[key]}')
+        if path:
+            print(f'##vso[task.setvariable variable={prefix}Path;]{path}')
+
+
+def summary_sections():
+    from reports import Section
+    return [
+        Section('total', 'Totals', [('name', 'Counter'), ('count', 'Count')]),
+        Section('os', 'By OS', [('os', 'OS'), ('computes', 'Computes'), ('hosts', 'Hosts')]),
+        Section('compute', 'By Compute', [('compute', 'Compute'), ('os', 'OS'), ('hosts', 'Hosts'),
+                                          ('users_created', 'Users Created'), ('groups_created', 'Groups Created'),
+                                          ('members_added', 'Members Added'), ('members_removed', 'Members Removed'),
+                                          ('errors', 'Errors')]),
+        Section('group', 'By Group', [('group', 'Group'), ('created', 'Created'), ('added', 'Members Added'),
+                                      ('removed', 'Members Removed')]),
+        Section('user', 'By User', [('user', 'User'), ('created', 'Created'), ('added_to', 'Added To'),
+                                    ('removed_from', 'Removed From')]),
+        Section('error', 'Error Buckets', [('bucket', 'Bucket'), ('level', 'Level'), ('count', 'Count'),
+                                           ('computes', 'Computes')]),
+    ]
+
+
+def write_summary_report(data, report, sections=None):
+    """Render a to_dict()/change_summary.json document through a reports backend."""
+    total, by_os, by_compute, by_group, by_user, by_error = sections or summary_sections()
+    report.begin()
+    for name, count in data.get('totals', {}).items():
+        report.record(total, (name, count))
+    for os_type, counts in data.get('os', {}).items():
+        report.record(by_os, (os_type, counts.get('computes', 0), counts.get('hosts', 0)))
+    for compute_name, counts in data.get('computes', {}).items():
+        report.record(by_compute, (compute_name, counts.get('os', ''), *(counts.get(key, 0) for key in by_compute.keys[2:])))
+    for group_name, counts in data.get('groups', {}).items():
+        report.record(by_group, (group_name, *(counts.get(key, 0) for key in by_group.keys[1:])))
+    for user, counts in data.get('users', {}).items():
+        report.record(by_user, (user, *(counts.get(key, 0) for key in by_user.keys[1:])))
+    for bucket in data.get('errors', []):
+        report.record(by_error, (bucket['bucket'], bucket['level'], bucket['count'], bucket.get('computes', [])))
+    report.end()
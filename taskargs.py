@@ -0,0 +1,179 @@
+"""Tokenizer for taskArguments strings.
+
+Grammar::
+
+    taskArguments := record (" " record)*
+    record        := verb [":" type] "|" field ("|" field)*
+    verb          := "create" | "modify" | "delete"
+    type          := "user" | "group"
+
+A field runs up to the next unescaped "|". Inside a field "\\|" stands for
+a literal "|" and "\\\\" for a literal backslash, so "|" and " create|"
+can appear in descriptions. A record ends where a space is followed by a
+verb and "|".
+
+Records tagged with a type are routed by the tag. Untagged records are
+classified by verb and field count: four or more fields is a user
+(name|fullname|password|groups), and a create with two or three is a group
+(name|description). An untagged modify or delete with fewer than four
+fields could be either (delete|alice), so it is rejected with a ValueError
+asking for a type tag.
+"""
+
+import re
+from functools import lru_cache
+from itertools import repeat
+
+VERBS = ("create", "modify", "delete")
+ENTITY_TYPES = ("user", "group")
+
+_RECORD_SPLIT = re.compile(r" (" + "|".join(VERBS) + r")(?::(" + "|".join(ENTITY_TYPES) + r"))?\|")
+_ESCAPED_FIELD = re.compile(r"(?:[^|\\]|\\.?)*", re.S)
+_UNESCAPE = re.compile(r"\\(.)", re.S)
+
+
+class UserRecord:
+    __slots__ = ("action", "username", "fullname", "password", "groups")
+
+    def __init__(self, action, username, fullname, password, groups):
+        self.action = action
+        self.username = username
+        self.fullname = fullname
+        self.password = password
+        self.groups = groups
+
+    @property
+    def name(self):
+        return self.username
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "username": self.username,
+            "fullname": self.fullname,
+            "password": self.password,
+            "groups": self.groups
+        }
+
+
+class GroupRecord:
+    __slots__ = ("action", "groupname", "description")
+
+    def __init__(self, action, groupname, description):
+        self.action = action
+        self.groupname = groupname
+        self.description = description
+
+    @property
+    def name(self):
+        return self.groupname
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "groupname": self.groupname,
+            "description": self.description
+        }
+
+
+def split_fields(body, maxsplit=-1):
+    if "\\" not in body:
+        return body.split("|", maxsplit)
+    fields = []
+    pos = 0
+    while True:
+        if len(fields) == maxsplit:
+            fields.append(body[pos:])
+            return fields
+        match = _ESCAPED_FIELD.match(body, pos)
+        fields.append(_UNESCAPE.sub(r"\1", match.group()))
+        pos = match.end() + 1
+        if pos > len(body):
+            return fields
+
+
+def split_records(task_arguments, maxsplit=-1):
+    """Return (verbs, tags, field_lists) for a taskArguments string.
+
+    verbs and tags are None when every record is an untagged create, which
+    lets the common case use a plain str.split instead of the regex. With
+    maxsplit, only the leading fields a caller needs are split out.
+    """
+    task_arguments = task_arguments.strip()
+    if task_arguments.startswith(VERBS):
+        # A leading space lets the first record match the same separator as
+        # the rest; any text before the first verb is not a record.
+        task_arguments = " " + task_arguments
+    if ("modify|" in task_arguments or "delete|" in task_arguments
+            or ":user|" in task_arguments or ":group|" in task_arguments):
+        parts = _RECORD_SPLIT.split(task_arguments)
+        verbs = parts[1::3]
+        tags = parts[2::3]
+        bodies = parts[3::3]
+    else:
+        verbs = tags = None
+        bodies = task_arguments.split(" create|")[1:]
+    if "\\" in task_arguments:
+        return verbs, tags, [split_fields(body, maxsplit) for body in bodies]
+    return verbs, tags, [body.split("|", maxsplit) for body in bodies]
+
+
+def tokenize(task_arguments):
+    """Yield (verb, type tag or None, fields) for every record in a taskArguments string."""
+    verbs, tags, field_lists = split_records(task_arguments)
+    if verbs is None:
+        verbs = repeat("create")
+        tags = repeat(None)
+    return zip(verbs, tags, field_lists)
+
+
+@lru_cache(maxsize=1024)
+def classify_task_arguments(task_arguments):
+    """Parse a taskArguments string once and route each record by type.
+
+    Returns (users, groups) as tuples of records. Results are cached per
+    unique string because many nodes share identical arguments; callers
+    must not mutate the returned records.
+
+    >>> users, groups = classify_task_arguments("create|alice|Alice|pw|admins delete:group|ops|")
+    >>> [user.username for user in users], [(group.action, group.groupname) for group in groups]
+    (['alice'], [('delete', 'ops')])
+    >>> classify_task_arguments("create|admins|Admins delete|alice")
+    Traceback (most recent call last):
+      ...
+    ValueError: Untagged record 'delete|alice' could be a user or a group; write it as delete:user|... or delete:group|...
+    """
+    verbs, tags, field_lists = split_records(task_arguments, 4)
+    users = []
+    groups = []
+    if verbs is None:
+        for details in field_lists:
+            if len(details) >= 4:
+                users.append(UserRecord("create", details[0], details[1], details[2], details[3].split(",")))
+            elif len(details) >= 2:
+                groups.append(GroupRecord("create", details[0], details[1]))
+        return tuple(users), tuple(groups)
+
+    for verb, tag, details in zip(verbs, tags, field_lists):
+        if tag is None:
+            if len(details) >= 4:
+                tag = "user"
+            elif verb != "create":
+                raise ValueError(f"Untagged record '{verb}|{'|'.join(details)}' could be a user or a group; "
+                                 f"write it as {verb}:user|... or {verb}:group|...")
+            elif len(details) >= 2:
+                tag = "group"
+        if tag == "user" and len(details) >= 4:
+            users.append(UserRecord(verb, details[0], details[1], details[2], details[3].split(",")))
+        elif tag == "group" and len(details) >= 2:
+            groups.append(GroupRecord(verb, details[0], details[1]))
+    return tuple(users), tuple(groups)
+
+
+def parse_task_arguments(task_arguments, entity_type):
+    users, groups = classify_task_arguments(task_arguments)
+    if entity_type == "user":
+        return list(users)
+    if entity_type == "group":
+        return list(groups)
+    return []
@@ -0,0 +1,63 @@
+param (
+    [string]$jsonPayload
+)
+
+# Apply every user and group operation for this host in one session and
+# write one JSON document with a result per operation.
+$payload = $jsonPayload | ConvertFrom-Json
+$results = New-Object System.Collections.Generic.List[object]
+
+foreach ($op in $payload.operations) {
+    $status = "ok"
+    $message = ""
+    try {
+        switch ($op.op) {
+            "create-group" {
+                if (Get-LocalGroup -Name $op.group -ErrorAction SilentlyContinue) {
+                    $status = "skipped"
+                    $message = "Group already exists"
+                } else {
+                    New-LocalGroup -Name $op.group -Description $op.description | Out-Null
+                }
+            }
+            "create-user" {
+                if (Get-LocalUser -Name $op.user -ErrorAction SilentlyContinue) {
+                    $status = "skipped"
+                    $message = "User already exists"
+                } else {
+                    $password = ConvertTo-SecureString -AsPlainText $op.password -Force
+                    New-LocalUser -Name $op.user -Password $password -Description $op.description | Out-Null
+                }
+                if ($op.rdp) {
+                    Add-LocalGroupMember -Group "Remote Desktop Users" -Member $op.user -ErrorAction SilentlyContinue
+                }
+            }
+            "add-member" {
+                if (Get-LocalGroupMember -Group $op.group -Member $op.user -ErrorAction SilentlyContinue) {
+                    $status = "skipped"
+                    $message = "Already a member"
+                } else {
+                    Add-LocalGroupMember -Group $op.group -Member $op.user -ErrorAction Stop
+                }
+            }
+            "remove-member" {
+                if (Get-LocalGroupMember -Group $op.group -Member $op.user -ErrorAction SilentlyContinue) {
+                    Remove-LocalGroupMember -Group $op.group -Member $op.user -ErrorAction Stop
+                } else {
+                    $status = "skipped"
+                    $message = "Not a member"
+                }
+            }
+            default {
+                $status = "failed"
+                $message = "Unknown operation: $($op.op)"
+            }
+        }
+    } catch {
+        $status = "failed"
+        $message = $_.Exception.Message
+    }
+    $results.Add([PSCustomObject]@{ id = $op.id; status = $status; message = $message })
+}
+
+ConvertTo-Json -Compress -Depth 3 -InputObject @($results)
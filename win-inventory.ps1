@@ -0,0 +1,22 @@
+# Report local users, groups and group memberships as one JSON document.
+# Local members lose their "COMPUTERNAME\" prefix so they match Get-LocalUser
+# names; domain members keep theirs, so CORP\alice is never taken for alice.
+$localPrefix = "$env:COMPUTERNAME\"
+$groups = @{}
+foreach ($group in Get-LocalGroup) {
+    $members = @(Get-LocalGroupMember -Group $group.Name -ErrorAction SilentlyContinue | ForEach-Object {
+        if ($_.Name.StartsWith($localPrefix, [System.StringComparison]::OrdinalIgnoreCase)) {
+            $_.Name.Substring($localPrefix.Length)
+        } else {
+            $_.Name
+        }
+    })
+    $groups[$group.Name] = $members
+}
+
+$inventory = [PSCustomObject]@{
+    users = @(Get-LocalUser | ForEach-Object { $_.Name })
+    groups = $groups
+}
+
+ConvertTo-Json -Compress -Depth 3 -InputObject $inventory